@@ -1,25 +1,21 @@
 import os
-import time
 import json
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, g
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from utils.document_processor import DocumentProcessor
 from utils.vector_store import VectorStore
 from utils.chat_handler import ChatHandler
+from utils.ingest_queue import IngestQueue
+from utils.file_hash import stage_stream
+from utils.metrics import metrics
+from utils.log_config import setup_logging, new_request_id, clear_request_id
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -32,83 +28,118 @@ ALLOWED_EXTENSIONS = {'txt', 'pdf'}
 doc_processor = DocumentProcessor()
 vector_store = VectorStore()
 chat_handler = ChatHandler(vector_store)
+ingest_queue = IngestQueue(doc_processor, vector_store)
+ingest_queue.start()
+
+def _document_gauge(field):
+    def collect():
+        totals = {}
+        for doc in vector_store.get_document_stats():
+            key = (("tenant", doc["tenant"]),)
+            totals[key] = totals.get(key, 0) + (doc[field] if field else 1)
+        return totals
+    return collect
+
+metrics.add_gauge("rag_documents", "Documents per tenant", _document_gauge(None))
+metrics.add_gauge("rag_chunks", "Indexed chunks per tenant", _document_gauge("chunk_count"))
+
+def _ingest_job_gauge():
+    totals = {}
+    for job in ingest_queue.list_jobs():
+        key = (("status", job["status"]),)
+        totals[key] = totals.get(key, 0) + 1
+    return totals
+
+metrics.add_gauge("rag_ingest_jobs", "Ingest jobs by status", _ingest_job_gauge)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def requested_tenants(data):
+    # 'tenants' 목록 또는 단일 'tenant'로 검색할 부서 컬렉션을 지정 (없으면 전체 검색)
+    tenants = data.get('tenants') or ([data['tenant']] if data.get('tenant') else None)
+    return list(tenants) if tenants else None
+
+@app.before_request
+def assign_request_id():
+    g.request_id = new_request_id(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def reset_request_id(exc):
+    clear_request_id()
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    logger.info("=== FILE UPLOAD REQUEST STARTED ===")
-    
     try:
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Request headers: {dict(request.headers)}")
-        logger.info(f"Request content length: {request.content_length}")
-        
         if 'file' not in request.files:
-            logger.warning("No file in request")
             return jsonify({'error': 'No file selected'}), 400
         
         file = request.files['file']
-        logger.info(f"File object received: {file}")
-        logger.info(f"File filename: {file.filename}")
-        logger.info(f"File content type: {file.content_type}")
-        
         if file.filename == '':
-            logger.warning("Empty filename")
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename):
             original_filename = file.filename
             filename = secure_filename(file.filename)
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            # 임시 파일에 받아 두고 색인이 끝난 뒤에만 제자리로 옮김 (같은 이름의 기존 문서 원본을 미리 덮어쓰지 않음)
+            staged_path, content_hash = stage_stream(file.stream, filepath)
+            tenant = request.form.get('tenant') or None
             
-            logger.info(f"Original filename: {original_filename}")
-            logger.info(f"Secure filename: {filename}")
-            logger.info(f"File path: {filepath}")
-            
-            logger.info("Starting file save...")
-            file.save(filepath)
-            logger.info("File saved successfully")
-            
-            file_size = os.path.getsize(filepath)
-            logger.info(f"Saved file size: {file_size} bytes")
-            
-            logger.info("Starting document processing...")
-            chunks = doc_processor.process_document(filepath)
-            logger.info(f"Document processing completed. Generated {len(chunks)} chunks")
+            # 바이트 단위로 같은 파일이 이미 색인돼 있으면 작업을 만들지 않고 기존 문서를 알려줌
+            duplicate = vector_store.find_duplicate(content_hash, tenant)
+            if duplicate is not None:
+                os.remove(staged_path)
+                metrics.items.inc(stage="upload", kind="duplicates")
+                logger.info("Duplicate upload skipped", extra={"document": original_filename,
+                                                              "duplicate_of": duplicate})
+                return jsonify({
+                    'success': f'{original_filename} is already indexed as {duplicate}',
+                    'duplicate_of': duplicate
+                }), 200
             
-            if len(chunks) > 100:
-                logger.warning(f"File too large: {len(chunks)} chunks (max 100)")
-                return jsonify({'error': f'File too large: {len(chunks)} chunks (max 100)'}), 400
+            # 추출/청킹/임베딩은 백그라운드 작업으로 처리하고 작업 ID를 즉시 반환
+            size_bytes = os.path.getsize(staged_path)
+            job_id = ingest_queue.enqueue(staged_path, original_filename, tenant=tenant, content_hash=content_hash,
+                                          target_path=filepath)
+            logger.info("Ingest job queued", extra={"document": original_filename, "job_id": job_id,
+                                                   "size_bytes": size_bytes})
             
-            logger.info("Adding documents to vector store...")
-            vector_store.add_documents(chunks, original_filename)
-            logger.info("Documents added to vector store successfully")
-            
-            logger.info(f"=== FILE UPLOAD COMPLETED SUCCESSFULLY: {original_filename} ===")
-            return jsonify({'success': f'Successfully uploaded and processed {original_filename}'}), 200
+            return jsonify({
+                'success': f'Upload received, processing {original_filename}',
+                'job_id': job_id
+            }), 202
             
         else:
-            logger.warning(f"Invalid file type: {file.filename}")
+            logger.warning("Rejected upload with invalid file type", extra={"document": file.filename})
             return jsonify({'error': 'Invalid file type. Only TXT and PDF files are allowed.'}), 400
             
     except Exception as e:
-        logger.error(f"=== UPLOAD ERROR OCCURRED ===")
-        logger.error(f"Error type: {type(e).__name__}")
-        logger.error(f"Error message: {str(e)}")
-        
-        import traceback
-        error_traceback = traceback.format_exc()
-        logger.error(f"Full traceback:\n{error_traceback}")
-        
-        logger.error("=== UPLOAD ERROR END ===")
+        logger.exception("Upload failed")
         return jsonify({'error': f'Error processing file: {str(e)}'}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = ingest_queue.get_status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not ingest_queue.cancel(job_id):
+        return jsonify({'error': 'Job is not active'}), 409
+    return jsonify({'success': 'Cancellation requested'}), 200
+
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json()
@@ -119,7 +150,7 @@ def chat():
         return jsonify({'error': 'No message provided'}), 400
     
     try:
-        response = chat_handler.get_response(user_message, session_id)
+        response = chat_handler.get_response(user_message, session_id, requested_tenants(data))
         return jsonify({'response': response}), 200
     except Exception as e:
         return jsonify({'error': f'Error generating response: {str(e)}'}), 500
@@ -129,42 +160,51 @@ def chat_stream():
     data = request.get_json()
     user_message = data.get('message', '')
     session_id = data.get('session_id', 'default')
+    tenants = requested_tenants(data)
     
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
     
+    def sse(payload):
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
     def generate():
         try:
-            response, sources = chat_handler.get_response(user_message, session_id)
-            
-            # 타자 효과를 위해 문자 단위로 전송
-            words = response.split(' ')
-            accumulated_text = ""
+            sources, deltas = chat_handler.stream_response(user_message, session_id, tenants)
             
-            for i, word in enumerate(words):
-                accumulated_text += word
-                if i < len(words) - 1:
-                    accumulated_text += " "
-                
-                # 응답과 출처 정보를 JSON으로 전송
-                data = {
-                    "text": accumulated_text,
-                    "sources": sources if i == len(words) - 1 else []  # 마지막에만 출처 전송
-                }
-                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-                time.sleep(0.05)  # 50ms 딜레이
+            # 검색이 끝나면 출처를 먼저 전송하고, 이후에는 증분 텍스트만 전송
+            yield sse({"sources": sources})
+            for delta in deltas:
+                yield sse({"delta": delta})
             
             yield f"data: [DONE]\n\n"
             
         except Exception as e:
-            error_data = {
-                "text": f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}",
-                "sources": []
-            }
-            yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+            yield sse({"error": f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}"})
             yield f"data: [DONE]\n\n"
     
-    return Response(generate(), mimetype='text/plain')
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+@app.route('/cache-stats')
+def cache_stats():
+    return jsonify({
+        'embedding_cache': vector_store.get_cache_stats(),
+        'answer_cache': chat_handler.get_cache_stats(),
+        'rerank_cache': chat_handler.get_rerank_stats()
+    }), 200
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/tenants')
+def list_tenants():
+    return jsonify({'tenants': vector_store.list_tenants()}), 200
+
+@app.route('/token-stats')
+def token_stats():
+    return jsonify(chat_handler.get_token_stats()), 200
 
 @app.route('/clear_conversation', methods=['POST'])
 def clear_conversation():
@@ -180,7 +220,8 @@ def clear_conversation():
 @app.route('/documents')
 def list_documents():
     try:
-        documents = vector_store.list_documents()
+        tenants = request.args.getlist('tenant') or None
+        documents = vector_store.list_documents(tenants)
         return jsonify({'documents': documents}), 200
     except Exception as e:
         return jsonify({'error': f'Error listing documents: {str(e)}'}), 500
@@ -203,20 +244,10 @@ def delete_document(document_name):
 
 if __name__ == '__main__':
     try:
-        logger.info("Starting application...")
         os.makedirs('documents', exist_ok=True)
         os.makedirs('data', exist_ok=True)
-        logger.info("Directories created/verified")
-        
-        logger.info("Initializing components...")
-        logger.info(f"Document processor: {doc_processor}")
-        logger.info(f"Vector store: {vector_store}")
-        logger.info(f"Chat handler: {chat_handler}")
-        
         logger.info("Starting Flask server on 0.0.0.0:5000")
         app.run(debug=True, host='0.0.0.0', port=5000)
-    except Exception as e:
-        logger.error(f"Failed to start application: {str(e)}")
-        import traceback
-        logger.error(f"Startup error traceback:\n{traceback.format_exc()}")
+    except Exception:
+        logger.exception("Failed to start application")
         raise
\ No newline at end of file
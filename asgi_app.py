@@ -0,0 +1,270 @@
+import os
+import json
+import asyncio
+import logging
+from functools import wraps
+from quart import Quart, render_template, request, jsonify, make_response, Response, g
+from werkzeug.utils import secure_filename
+from dotenv import load_dotenv
+from utils.document_processor import DocumentProcessor
+from utils.file_hash import stage_stream
+from utils.ingest_queue import IngestQueue
+from utils.vector_store import VectorStore
+from utils.chat_handler import ChatHandler
+from utils.metrics import metrics
+from utils.log_config import setup_logging, new_request_id
+
+load_dotenv()
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app.config['UPLOAD_FOLDER'] = 'documents'
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+ALLOWED_EXTENSIONS = {'txt', 'pdf'}
+
+# 라우트별 동시 처리 한도 (초과 요청은 대기열에서 순서를 기다림)
+ROUTE_LIMITS = {
+    'chat': int(os.getenv('CHAT_CONCURRENCY', 200)),
+    'upload': int(os.getenv('UPLOAD_CONCURRENCY', 4)),
+    'documents': int(os.getenv('DOCUMENTS_CONCURRENCY', 50)),
+}
+
+vector_store = VectorStore()
+chat_handler = ChatHandler(vector_store)
+# Flask 앱과 같은 작업 큐로 추출/임베딩을 처리 (임대 기반 재개, 취소, /jobs 진행 상황 조회)
+ingest_queue = IngestQueue(DocumentProcessor(), vector_store)
+semaphores = {}
+
+def _document_gauge(field):
+    def collect():
+        totals = {}
+        for doc in vector_store.get_document_stats():
+            key = (("tenant", doc["tenant"]),)
+            totals[key] = totals.get(key, 0) + (doc[field] if field else 1)
+        return totals
+    return collect
+
+metrics.add_gauge("rag_documents", "Documents per tenant", _document_gauge(None))
+metrics.add_gauge("rag_chunks", "Indexed chunks per tenant", _document_gauge("chunk_count"))
+
+def _ingest_job_gauge():
+    totals = {}
+    for job in ingest_queue.list_jobs():
+        key = (("status", job["status"]),)
+        totals[key] = totals.get(key, 0) + 1
+    return totals
+
+metrics.add_gauge("rag_ingest_jobs", "Ingest jobs by status", _ingest_job_gauge)
+
+def limit_concurrency(route_name):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with semaphores[route_name]:
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def requested_tenants(data):
+    # 'tenants' 목록 또는 단일 'tenant'로 검색할 부서 컬렉션을 지정 (없으면 전체 검색)
+    tenants = data.get('tenants') or ([data['tenant']] if data.get('tenant') else None)
+    return list(tenants) if tenants else None
+
+@app.before_request
+async def assign_request_id():
+    g.request_id = new_request_id(request.headers.get('X-Request-ID'))
+
+@app.after_request
+async def add_request_id_header(response):
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.before_serving
+async def startup():
+    os.makedirs('documents', exist_ok=True)
+    os.makedirs('data', exist_ok=True)
+    ingest_queue.start()
+    for name, limit in ROUTE_LIMITS.items():
+        semaphores[name] = asyncio.Semaphore(limit)
+    logger.info(f"ASGI server ready (route limits: {ROUTE_LIMITS})")
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/upload', methods=['POST'])
+@limit_concurrency('upload')
+async def upload_file():
+    try:
+        files = await request.files
+        if 'file' not in files:
+            return jsonify({'error': 'No file selected'}), 400
+
+        file = files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type. Only TXT and PDF files are allowed.'}), 400
+
+        original_filename = file.filename
+        form = await request.form
+        tenant = form.get('tenant') or None
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+        # 임시 파일에 받아 두고 색인이 끝난 뒤에만 제자리로 옮김 (같은 이름의 기존 문서 원본을 미리 덮어쓰지 않음)
+        staged_path, content_hash = await asyncio.to_thread(stage_stream, file.stream, filepath)
+
+        duplicate = await asyncio.to_thread(vector_store.find_duplicate, content_hash, tenant)
+        if duplicate is not None:
+            os.remove(staged_path)
+            metrics.items.inc(stage="upload", kind="duplicates")
+            logger.info("Duplicate upload skipped", extra={"document": original_filename, "duplicate_of": duplicate})
+            return jsonify({'success': f'{original_filename} is already indexed as {duplicate}',
+                            'duplicate_of': duplicate}), 200
+
+        # 추출/청킹/임베딩은 백그라운드 작업으로 처리하고 작업 ID를 즉시 반환 (요청과 업로드 슬롯을 오래 잡지 않음)
+        size_bytes = os.path.getsize(staged_path)
+        job_id = await asyncio.to_thread(ingest_queue.enqueue, staged_path, original_filename, tenant=tenant,
+                                         content_hash=content_hash, target_path=filepath)
+        logger.info("Ingest job queued", extra={"document": original_filename, "job_id": job_id,
+                                               "size_bytes": size_bytes})
+        return jsonify({'success': f'Upload received, processing {original_filename}',
+                        'job_id': job_id}), 202
+
+    except Exception as e:
+        logger.exception("Upload failed")
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>')
+async def job_status(job_id):
+    job = await asyncio.to_thread(ingest_queue.get_status, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+async def cancel_job(job_id):
+    if not await asyncio.to_thread(ingest_queue.cancel, job_id):
+        return jsonify({'error': 'Job is not active'}), 409
+    return jsonify({'success': 'Cancellation requested'}), 200
+
+@app.route('/chat', methods=['POST'])
+@limit_concurrency('chat')
+async def chat():
+    data = await request.get_json()
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    try:
+        response = await chat_handler.aget_response(user_message, session_id, requested_tenants(data))
+        return jsonify({'response': response}), 200
+    except Exception as e:
+        return jsonify({'error': f'Error generating response: {str(e)}'}), 500
+
+@app.route('/chat-stream', methods=['POST'])
+async def chat_stream():
+    data = await request.get_json()
+    user_message = data.get('message', '')
+    session_id = data.get('session_id', 'default')
+    tenants = requested_tenants(data)
+
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    def sse(payload):
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    async def generate():
+        # 스트림이 열려 있는 동안 chat 슬롯을 점유
+        async with semaphores['chat']:
+            try:
+                sources, deltas = await chat_handler.astream_response(user_message, session_id, tenants)
+                yield sse({"sources": sources})
+                async for delta in deltas:
+                    yield sse({"delta": delta})
+                yield "data: [DONE]\n\n"
+            except Exception as e:
+                yield sse({"error": f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}"})
+                yield "data: [DONE]\n\n"
+
+    response = await make_response(generate(), {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.timeout = None
+    return response
+
+@app.route('/cache-stats')
+async def cache_stats():
+    return jsonify({
+        'embedding_cache': vector_store.get_cache_stats(),
+        'answer_cache': chat_handler.get_cache_stats(),
+        'rerank_cache': chat_handler.get_rerank_stats()
+    }), 200
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/tenants')
+async def list_tenants():
+    return jsonify({'tenants': await asyncio.to_thread(vector_store.list_tenants)}), 200
+
+@app.route('/token-stats')
+async def token_stats():
+    return jsonify(chat_handler.get_token_stats()), 200
+
+@app.route('/clear_conversation', methods=['POST'])
+async def clear_conversation():
+    data = await request.get_json()
+    session_id = data.get('session_id', 'default')
+
+    try:
+        chat_handler.clear_conversation(session_id)
+        return jsonify({'success': 'Conversation cleared'}), 200
+    except Exception as e:
+        return jsonify({'error': f'Error clearing conversation: {str(e)}'}), 500
+
+@app.route('/documents')
+@limit_concurrency('documents')
+async def list_documents():
+    try:
+        tenants = request.args.getlist('tenant') or None
+        documents = await asyncio.to_thread(vector_store.list_documents, tenants)
+        return jsonify({'documents': documents}), 200
+    except Exception as e:
+        return jsonify({'error': f'Error listing documents: {str(e)}'}), 500
+
+@app.route('/documents/<document_name>', methods=['DELETE'])
+@limit_concurrency('documents')
+async def delete_document(document_name):
+    try:
+        await asyncio.to_thread(vector_store.delete_document, document_name)
+
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(document_name))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        return jsonify({'success': f'Document {document_name} deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': f'Error deleting document: {str(e)}'}), 500
+
+if __name__ == '__main__':
+    # 운영 환경에서는: hypercorn asgi_app:app --bind 0.0.0.0:5000
+    from hypercorn.config import Config
+    from hypercorn.asyncio import serve
+
+    config = Config()
+    config.bind = ['0.0.0.0:5000']
+    logger.info("Starting ASGI server on 0.0.0.0:5000")
+    asyncio.run(serve(app, config))
@@ -0,0 +1,102 @@
+"""
+청킹 마이크로벤치마크: 기존 RecursiveCharacterTextSplitter(글자 수 기준)와 SentenceChunker(문장 경계 + 토큰 수 기준) 비교
+
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --corpus documents/*.pdf --repeat 5 --chunk-tokens 400
+
+텍스트 추출은 한 번만 하고, 메모리에 올린 페이지 텍스트로 청킹 단계만 반복 측정:
+- 청킹 시간(최소/중앙값), 청크 수
+- 청크당 토큰 수 분포(평균/p95/최대)와 토큰 한도 초과 청크 수
+- 문장/줄 중간에서 끝나는 청크 비율
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utils.document_processor import DocumentProcessor
+from utils.token_counter import count_tokens
+
+_SENTENCE_CLOSED = re.compile(r'[.?!。？！…]["\'”’)\]]*$')
+
+def measure(name, chunk_fn, pages, repeat, chunk_tokens):
+    timings, chunks = [], []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        chunks = list(chunk_fn(iter(pages)))
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    tokens = np.asarray([count_tokens(chunk) for chunk in chunks] or [0])
+    # 청크 뒤에 이어지는 원문이 줄바꿈으로 시작하거나 청크가 종결 부호로 끝나면 경계에서 끊긴 것으로 봄
+    text = "\n".join(page_text or "" for _, page_text in pages)
+    mid_boundary, cursor = 0, 0
+    for chunk in chunks:
+        position = text.find(chunk, cursor)
+        if position < 0:
+            continue
+        cursor = position + 1
+        following = text[position + len(chunk):position + len(chunk) + 1]
+        if following not in ("", "\n") and not _SENTENCE_CLOSED.search(chunk):
+            mid_boundary += 1
+    return {
+        "splitter": name,
+        "chunks": len(chunks),
+        "min_ms": round(min(timings), 2),
+        "median_ms": round(float(np.median(timings)), 2),
+        "tokens_mean": round(float(tokens.mean()), 1),
+        "tokens_p95": int(np.percentile(tokens, 95)),
+        "tokens_max": int(tokens.max()),
+        "over_budget": int((tokens > chunk_tokens).sum()),
+        "mid_boundary_ratio": round(mid_boundary / len(chunks), 3) if chunks else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="청킹 마이크로벤치마크")
+    parser.add_argument("--corpus", nargs="+", default=[os.path.join(REPO_ROOT, "documents", "*")],
+                        help="벤치마크할 문서 경로/글롭")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-tokens", type=int, default=500)
+    parser.add_argument("--overlap-tokens", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="기존 분할기의 글자 수 한도")
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--output", help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    os.environ['CHUNK_TOKENS'] = str(args.chunk_tokens)
+    os.environ['CHUNK_OVERLAP_TOKENS'] = str(args.overlap_tokens)
+    processor = DocumentProcessor(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    files = sorted({path for pattern in args.corpus for path in glob.glob(pattern)
+                    if path.lower().endswith(('.pdf', '.txt'))})
+
+    results = []
+    for path in files:
+        pages = list(processor._iter_pages(path))
+        characters = sum(len(text or "") for _, text in pages)
+        print(f"{os.path.basename(path)}: {len(pages)} pages, {characters:,} chars")
+        splitters = [
+            ("recursive", lambda pages: (chunk for chunk, _ in processor._split_pages(pages))),
+            ("sentence", lambda pages: (chunk.text for chunk in processor.sentence_chunker.chunk_pages(pages))),
+        ]
+        for name, chunk_fn in splitters:
+            result = measure(name, chunk_fn, pages, args.repeat, args.chunk_tokens)
+            result["document"] = os.path.basename(path)
+            results.append(result)
+            print(f"  {name:<10} {result['chunks']:>5} chunks  {result['median_ms']:>9.2f} ms  "
+                  f"tokens mean {result['tokens_mean']:>6.1f} p95 {result['tokens_p95']:>5} max {result['tokens_max']:>5}  "
+                  f"over budget {result['over_budget']:>3}  mid-boundary {result['mid_boundary_ratio']:.1%}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+벤치마크용 로컬 OpenAI 대체 서버
+
+    python -m benchmarks.fake_openai --port 8089 --latency-ms 50 --token-delay-ms 10
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python app.py
+
+- /v1/embeddings: 텍스트 토큰 해시 기반의 결정적 임베딩 (같은 단어가 많을수록 코사인 유사도가 높음)
+- /v1/chat/completions: 고정 답변, stream=true면 SSE 청크로 전송
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from utils.keyword_index import tokenize
+
+CANNED_ANSWER = ("문의하신 내용은 업로드된 문서의 관련 조항을 기준으로 안내드립니다. "
+                 "지원 대상과 신청 방법, 필요 서류는 담당 부서에 확인하시면 정확합니다.")
+
+def fake_embedding(text: str, dimensions: int = 1536) -> list:
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for token in tokenize(text) or [text]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimensions
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = {"latency_ms": 0.0, "token_delay_ms": 0.0, "dimensions": 1536}
+    stats = {"embeddings": 0, "embedded_texts": 0, "chat": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.config["latency_ms"] / 1000)
+
+        if self.path.endswith("/embeddings"):
+            self._embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self._chat(request)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def _embeddings(self, request: dict):
+        texts = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        with self.stats_lock:
+            self.stats["embeddings"] += 1
+            self.stats["embedded_texts"] += len(texts)
+        self._send_json({
+            "object": "list",
+            "model": request.get("model", "fake"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text, self.config["dimensions"])}
+                     for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _chat(self, request: dict):
+        with self.stats_lock:
+            self.stats["chat"] += 1
+        created = int(time.time())
+        if not request.get("stream"):
+            self._send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created,
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": CANNED_ANSWER}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(CANNED_ANSWER) // 2, "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        words = CANNED_ANSWER.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            write_event(json.dumps({
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }, ensure_ascii=False))
+            time.sleep(self.config["token_delay_ms"] / 1000)
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+def start_server(port: int = 0, latency_ms: float = 0.0, token_delay_ms: float = 0.0):
+    """백그라운드 스레드에서 서버를 시작하고 (server, base_url)을 반환"""
+    FakeOpenAIHandler.config.update(latency_ms=latency_ms, token_delay_ms=token_delay_ms)
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 OpenAI 대체 서버")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="요청마다 응답 전 지연")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="스트리밍 청크 사이 지연")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.latency_ms, args.token_delay_ms)
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+RAG 파이프라인 종단간 벤치마크 (실제 OpenAI API 대신 로컬 대체 서버 사용)
+
+    python -m benchmarks.run --queries 200 --sessions 50 --latency-ms 30
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+
+임시 작업 디렉터리에서 app.py의 구성요소를 그대로 띄워 다음을 측정하고 JSON으로 저장:
+- 수집 처리량: DocumentProcessor + VectorStore.add_documents
+- 질의 지연(p50/p95/p99): VectorStore.search, ChatHandler.get_response
+- /chat-stream 첫 바이트/첫 토큰까지의 시간
+- 동시 세션 N개 처리 전후 메모리 증가량
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_openai import FakeOpenAIHandler, start_server
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+def make_queries(chunks, count, seed=0):
+    """코퍼스 청크에서 질문처럼 쓸 짧은 구절을 뽑음 (서로 다른 질의라 캐시에 걸리지 않음)"""
+    rng = random.Random(seed)
+    queries = set()
+    attempts = 0
+    while len(queries) < count and attempts < count * 20:
+        attempts += 1
+        chunk = rng.choice(chunks)
+        words = chunk.split()
+        if len(words) < 4:
+            continue
+        start = rng.randrange(0, len(words) - 3)
+        queries.add(" ".join(words[start:start + rng.randint(3, 8)]))
+    return list(queries)
+
+def bench_ingest(doc_processor, vector_store, files):
+    extract_seconds, index_seconds, total_chunks, total_chars = 0.0, 0.0, 0, 0
+    all_chunks = []
+    for path in files:
+        started_at = time.perf_counter()
+        chunks, chunk_metadatas = doc_processor.process_document_with_metadata(path)
+        extracted_at = time.perf_counter()
+        vector_store.add_documents(chunks, os.path.basename(path), chunk_metadatas=chunk_metadatas)
+        extract_seconds += extracted_at - started_at
+        index_seconds += time.perf_counter() - extracted_at
+        total_chunks += len(chunks)
+        total_chars += sum(len(chunk) for chunk in chunks)
+        all_chunks.extend(chunks)
+
+    total_seconds = extract_seconds + index_seconds
+    return {
+        "files": len(files),
+        "chunks": total_chunks,
+        "chars": total_chars,
+        "extract_seconds": round(extract_seconds, 3),
+        "index_seconds": round(index_seconds, 3),
+        "chunks_per_second": round(total_chunks / total_seconds, 2) if total_seconds else 0.0,
+    }, all_chunks
+
+def bench_search(vector_store, queries):
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        vector_store.search(query, n_results=5)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    return percentiles(latencies)
+
+def bench_chat(chat_handler, queries):
+    latencies = []
+    for i, query in enumerate(queries):
+        started_at = time.perf_counter()
+        chat_handler.get_response(query, session_id=f"bench-chat-{i}")
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    return percentiles(latencies)
+
+def bench_chat_stream(flask_app, queries):
+    """실제 HTTP 서버로 /chat-stream을 호출해 첫 바이트(출처 이벤트)와 첫 토큰까지의 시간을 측정"""
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    first_byte, first_delta, total = [], [], []
+    try:
+        for i, query in enumerate(queries):
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            body = json.dumps({"message": query, "session_id": f"bench-stream-{i}"})
+            started_at = time.perf_counter()
+            connection.request("POST", "/chat-stream", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            buffer, got_first_byte, got_delta = b"", False, False
+            while True:
+                data = response.read1(4096)
+                if not data:
+                    break
+                now = (time.perf_counter() - started_at) * 1000
+                if not got_first_byte:
+                    first_byte.append(now)
+                    got_first_byte = True
+                buffer += data
+                if not got_delta and b'"delta"' in buffer:
+                    first_delta.append(now)
+                    got_delta = True
+            total.append((time.perf_counter() - started_at) * 1000)
+            connection.close()
+    finally:
+        server.shutdown()
+
+    return {"first_byte": percentiles(first_byte), "first_token": percentiles(first_delta),
+            "total": percentiles(total)}
+
+def bench_memory(chat_handler, queries, sessions, turns, concurrency):
+    """동시 세션 N개가 turns번씩 대화한 뒤의 Python 힙/RSS 증가량"""
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    heap_before, _ = tracemalloc.get_traced_memory()
+
+    def run_session(session_index):
+        for turn in range(turns):
+            query = queries[(session_index * turns + turn) % len(queries)]
+            chat_handler.get_response(f"{query} ({turn})", session_id=f"bench-mem-{session_index}")
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_session, range(sessions)))
+    elapsed = time.perf_counter() - started_at
+
+    heap_after, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_bytes()
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(sessions * turns / elapsed, 2) if elapsed else 0.0,
+        "heap_growth_bytes": heap_after - heap_before,
+        "heap_peak_bytes": heap_peak,
+        "heap_growth_per_session_bytes": (heap_after - heap_before) // max(sessions, 1),
+        "rss_growth_bytes": rss_after - rss_before,
+    }
+
+def compare(current, baseline_path):
+    """주요 지표를 기준 결과와 비교해 출력 (지연은 증가, 처리량은 감소가 회귀)"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def flatten(prefix, value, out):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                flatten(f"{prefix}.{key}" if prefix else key, child, out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix] = value
+        return out
+
+    current_flat = flatten("", {k: v for k, v in current.items() if k != "meta"}, {})
+    baseline_flat = flatten("", {k: v for k, v in baseline.items() if k != "meta"}, {})
+    print(f"\nComparison with {baseline_path} ({baseline.get('meta', {}).get('git_commit', '?')})")
+    for key in sorted(current_flat):
+        if key not in baseline_flat or not key.endswith(("_ms", "_per_second", "_bytes")):
+            continue
+        before, after = baseline_flat[key], current_flat[key]
+        change = (after - before) / before * 100 if before else 0.0
+        worse = change < 0 if key.endswith("_per_second") else change > 0
+        flag = "  <-- regression" if worse and abs(change) >= 10 else ""
+        print(f"  {key:<45} {before:>14,.2f} -> {after:>14,.2f} ({change:+.1f}%){flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 파이프라인 벤치마크")
+    parser.add_argument("--corpus", nargs="+", default=[os.path.join(REPO_ROOT, "documents", "*")],
+                        help="수집할 파일 glob (기본값: documents/*)")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--stream-queries", type=int, default=30)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="대체 서버의 요청당 지연")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="대체 서버의 스트리밍 청크 간 지연")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본값: benchmarks/results/bench-<시각>.json)")
+    parser.add_argument("--compare", help="비교할 기준 결과 JSON")
+    args = parser.parse_args()
+
+    files = sorted({os.path.abspath(path) for pattern in args.corpus for path in glob.glob(pattern)
+                    if path.lower().endswith((".txt", ".pdf"))})
+    if not files:
+        parser.error("No .txt/.pdf files matched --corpus")
+
+    output = os.path.abspath(args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    fake_server, base_url = start_server(latency_ms=args.latency_ms, token_delay_ms=args.token_delay_ms)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "fake-key"
+
+    # data/, cache/, logs/가 실제 운영 디렉터리를 건드리지 않도록 임시 디렉터리에서 실행
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    os.chdir(workdir)
+    os.makedirs("documents", exist_ok=True)
+    import app as flask_app_module
+
+    print(f"Benchmark workdir: {workdir}")
+    print(f"Ingesting {len(files)} files...")
+    ingest, chunks = bench_ingest(flask_app_module.doc_processor, flask_app_module.vector_store, files)
+    queries = make_queries(chunks, args.queries + args.stream_queries + args.queries)
+    search_queries = queries[:args.queries]
+    chat_queries = queries[args.queries:args.queries * 2]
+    stream_queries = queries[args.queries * 2:]
+
+    print("Measuring VectorStore.search...")
+    search = bench_search(flask_app_module.vector_store, search_queries)
+    print("Measuring ChatHandler.get_response...")
+    chat = bench_chat(flask_app_module.chat_handler, chat_queries)
+    print("Measuring /chat-stream...")
+    chat_stream = bench_chat_stream(flask_app_module.app, stream_queries)
+    print(f"Measuring memory with {args.sessions} concurrent sessions...")
+    memory = bench_memory(flask_app_module.chat_handler, queries, args.sessions, args.turns, args.concurrency)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            "fake_openai_requests": dict(FakeOpenAIHandler.stats),
+        },
+        "ingest": ingest,
+        "search": search,
+        "chat": chat,
+        "chat_stream": chat_stream,
+        "memory": memory,
+    }
+    fake_server.shutdown()
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps({key: value for key, value in results.items() if key != "meta"}, indent=2))
+    print(f"Results saved to {output}")
+
+    if baseline:
+        compare(results, baseline)
+    os._exit(0)  # 수집 큐 워커 등 데몬 스레드를 기다리지 않고 종료
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+벡터 저장소 관리 명령 (서버를 멈춘 상태에서 실행)
+
+    python manage.py reembed --provider local
+    python manage.py rebuild-index --profile recall --all
+    python manage.py index-report --output reports/hnsw.json
+"""
+import argparse
+import sys
+
+from utils.embedding_provider import create_embedding_provider
+from utils.vector_store import HNSW_PROFILES
+from utils.index_maintenance import (list_collection_names, rebuild_collection, reembed_collection,
+                                     profile_report, save_report)
+
+def _target_collections(args):
+    return list_collection_names(args.persist_directory) if args.all else [args.collection]
+
+def reembed(args):
+    """컬렉션을 지정한 임베딩 백엔드/모델로 다시 임베딩"""
+    provider = create_embedding_provider(args.provider, args.model)
+    for collection_name in _target_collections(args):
+        reembed_collection(provider, collection_name=collection_name, persist_directory=args.persist_directory)
+
+def rebuild_index(args):
+    """저장된 임베딩으로 HNSW 색인을 재구성 (삭제 공간 정리 + 프로파일 적용)"""
+    for collection_name in _target_collections(args):
+        rebuild_collection(collection_name, persist_directory=args.persist_directory, profile=args.profile)
+
+def index_report(args):
+    """프로파일별 recall@k / 검색 지연 비교"""
+    report = profile_report(args.collection, persist_directory=args.persist_directory,
+                            profiles=args.profiles, num_queries=args.queries, k=args.k)
+    if args.output:
+        save_report(report, args.output)
+        print(f"Report saved to {args.output}")
+
+def _add_collection_arguments(parser, allow_all=True):
+    parser.add_argument("--collection", default="documents")
+    if allow_all:
+        parser.add_argument("--all", action="store_true", help="모든 테넌트 컬렉션에 적용")
+    parser.add_argument("--persist-directory", default="data")
+
+def main():
+    parser = argparse.ArgumentParser(description="밀양시 AI 어시스턴트 벡터 저장소 관리")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reembed_parser = subparsers.add_parser("reembed", help="컬렉션 전체를 새 임베딩 모델로 다시 임베딩")
+    reembed_parser.add_argument("--provider", choices=["openai", "local"],
+                                help="임베딩 백엔드 (기본값: EMBEDDING_PROVIDER 환경변수)")
+    reembed_parser.add_argument("--model", help="임베딩 모델 (기본값: EMBEDDING_MODEL 환경변수 또는 백엔드 기본 모델)")
+    _add_collection_arguments(reembed_parser)
+    reembed_parser.set_defaults(func=reembed)
+
+    rebuild_parser = subparsers.add_parser("rebuild-index", help="저장된 임베딩으로 HNSW 색인 재구성/압축")
+    rebuild_parser.add_argument("--profile", choices=list(HNSW_PROFILES),
+                                help="HNSW 프로파일 (기본값: HNSW_PROFILE 환경변수 또는 balanced)")
+    _add_collection_arguments(rebuild_parser)
+    rebuild_parser.set_defaults(func=rebuild_index)
+
+    report_parser = subparsers.add_parser("index-report", help="HNSW 프로파일별 recall/지연 비교 리포트")
+    report_parser.add_argument("--profiles", nargs="+", choices=list(HNSW_PROFILES))
+    report_parser.add_argument("--queries", type=int, default=200)
+    report_parser.add_argument("--k", type=int, default=10)
+    report_parser.add_argument("--output", help="JSON 결과 파일 경로")
+    _add_collection_arguments(report_parser, allow_all=False)
+    report_parser.set_defaults(func=index_report)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"❌ 오류가 발생했습니다: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -101,6 +101,53 @@ document.addEventListener('DOMContentLoaded', function() {
             
             const reader = response.body.getReader();
             const decoder = new TextDecoder();
+            const textDiv = document.createElement('div');
+            responseContentDiv.appendChild(textDiv);
+            let accumulatedText = '';
+            let buffer = '';
+            
+            function renderSources(sources) {
+                if (sources.length === 0) {
+                    return;
+                }
+                const sourcesDiv = document.createElement('div');
+                sourcesDiv.className = 'message-sources';
+                sourcesDiv.innerHTML = `
+                    <div class="sources-title">
+                        <i class="fas fa-file-alt"></i> 참고 문서
+                    </div>
+                    <div class="sources-list">
+                        ${sources.map(source => `<span class="source-item">${source}</span>`).join('')}
+                    </div>
+                `;
+                responseContentDiv.appendChild(sourcesDiv);
+            }
+            
+            function handleEvent(data) {
+                if (data === '[DONE]') {
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                    return;
+                }
+                
+                // JSON 데이터 파싱: 출처는 먼저 한 번, 이후에는 증분 텍스트(delta)만 전송됨
+                const jsonData = JSON.parse(data);
+                if (jsonData.sources) {
+                    renderSources(jsonData.sources);
+                }
+                if (jsonData.delta) {
+                    accumulatedText += jsonData.delta;
+                }
+                if (jsonData.error) {
+                    accumulatedText = jsonData.error;
+                }
+                
+                // 마크다운을 HTML로 변환하고 XSS 방지
+                const htmlContent = marked.parse(accumulatedText);
+                textDiv.innerHTML = DOMPurify.sanitize(htmlContent);
+                
+                // 스크롤을 맨 아래로
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            }
             
             function readStream() {
                 reader.read().then(({ done, value }) => {
@@ -108,53 +155,19 @@ document.addEventListener('DOMContentLoaded', function() {
                         return;
                     }
                     
-                    const chunk = decoder.decode(value);
-                    const lines = chunk.split('\n');
+                    // 이벤트가 여러 청크에 걸쳐 올 수 있으므로 빈 줄 단위로 잘라서 처리
+                    buffer += decoder.decode(value, { stream: true });
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
                     
-                    for (const line of lines) {
-                        if (line.startsWith('data: ')) {
-                            const data = line.substring(6);
-                            if (data === '[DONE]') {
-                                chatMessages.scrollTop = chatMessages.scrollHeight;
-                                return;
-                            }
-                            
-                            try {
-                                // JSON 데이터 파싱
-                                const jsonData = JSON.parse(data);
-                                const text = jsonData.text;
-                                const sources = jsonData.sources || [];
-                                
-                                // 마크다운을 HTML로 변환하고 XSS 방지
-                                const htmlContent = marked.parse(text);
-                                const cleanHtml = DOMPurify.sanitize(htmlContent);
-                                
-                                // 응답 텍스트 표시
-                                responseContentDiv.innerHTML = cleanHtml;
-                                
-                                // 출처 정보가 있고 마지막 청크인 경우 출처 표시
-                                if (sources.length > 0) {
-                                    const sourcesDiv = document.createElement('div');
-                                    sourcesDiv.className = 'message-sources';
-                                    sourcesDiv.innerHTML = `
-                                        <div class="sources-title">
-                                            <i class="fas fa-file-alt"></i> 참고 문서
-                                        </div>
-                                        <div class="sources-list">
-                                            ${sources.map(source => `<span class="source-item">${source}</span>`).join('')}
-                                        </div>
-                                    `;
-                                    responseContentDiv.appendChild(sourcesDiv);
+                    for (const event of events) {
+                        for (const line of event.split('\n')) {
+                            if (line.startsWith('data: ')) {
+                                try {
+                                    handleEvent(line.substring(6));
+                                } catch (e) {
+                                    console.error('Stream parse error:', e);
                                 }
-                                
-                                // 스크롤을 맨 아래로
-                                chatMessages.scrollTop = chatMessages.scrollHeight;
-                            } catch (e) {
-                                // JSON 파싱 실패시 기존 방식으로 처리
-                                const htmlContent = marked.parse(data);
-                                const cleanHtml = DOMPurify.sanitize(htmlContent);
-                                responseContentDiv.innerHTML = cleanHtml;
-                                chatMessages.scrollTop = chatMessages.scrollHeight;
                             }
                         }
                     }
@@ -237,6 +250,47 @@ document.addEventListener('DOMContentLoaded', function() {
         return messageDiv;
     }
 
+    function pollJob(jobId) {
+        // 백그라운드 처리 작업의 진행 상황 표시
+        const progressDiv = document.createElement('div');
+        progressDiv.className = 'upload-status text-info';
+        uploadForm.appendChild(progressDiv);
+        
+        function check() {
+            fetch(`/jobs/${jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'queued' || job.status === 'running') {
+                    progressDiv.textContent = `처리 중... 페이지 ${job.pages_extracted}/${job.pages_total || '?'}, ` +
+                        `임베딩 ${job.chunks_embedded}/${job.chunks_total || '?'}, 저장 ${job.chunks_written}/${job.chunks_total || '?'}`;
+                    setTimeout(check, 1000);
+                    return;
+                }
+                
+                if (job.status === 'completed') {
+                    progressDiv.className = 'upload-status text-success';
+                    progressDiv.textContent = job.duplicate_of
+                        ? `${job.document_name}은(는) 이미 색인된 ${job.duplicate_of}와 같은 파일입니다`
+                        : job.chunks_reused
+                        ? `${job.document_name} 업데이트 완료 (재사용 ${job.chunks_reused}개, 새로 임베딩 ${job.chunks_total - job.chunks_reused}개)`
+                        : `${job.document_name} 처리 완료`;
+                    loadDocuments();
+                } else {
+                    progressDiv.className = 'upload-status text-danger';
+                    progressDiv.textContent = job.status === 'cancelled' ? '처리가 취소되었습니다.' : '오류: ' + (job.error || job.status);
+                }
+                setTimeout(() => {
+                    progressDiv.remove();
+                }, 5000);
+            })
+            .catch(() => {
+                setTimeout(check, 3000);
+            });
+        }
+        
+        check();
+    }
+
     function uploadFile() {
         const file = fileInput.files[0];
         if (!file) {
@@ -266,6 +320,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 successDiv.textContent = data.success;
                 uploadForm.appendChild(successDiv);
                 
+                if (data.job_id) {
+                    pollJob(data.job_id);
+                }
+                
                 // 파일 입력 및 UI 초기화
                 fileInput.value = '';
                 selectedFileName.style.display = 'none';
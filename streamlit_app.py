@@ -9,18 +9,14 @@ import uuid
 from utils.document_processor import DocumentProcessor
 from utils.vector_store import VectorStore
 from utils.chat_handler import ChatHandler
+from utils.ingest_queue import IngestQueue
+from utils.file_hash import stage_stream
+from utils.log_config import setup_logging
 
 load_dotenv()
 
 # 로깅 설정
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Streamlit 페이지 설정
@@ -31,8 +27,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS 스타일 적용
-st.markdown("""
+# CSS 스타일 (main()에서 주입. fragment 재실행 시에는 다시 보내지 않음)
+APP_CSS = """
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+KR:wght@300;400;500;700&display=swap');
     
@@ -156,11 +152,13 @@ st.markdown("""
         box-shadow: 0 2px 8px rgba(79, 172, 254, 0.3);
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # 초기화
 ALLOWED_EXTENSIONS = {'txt', 'pdf'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+TRANSCRIPT_PAGE_SIZE = int(os.getenv('TRANSCRIPT_PAGE_SIZE', 20))  # 한 번에 그리는 최근 메시지 수
+JOB_POLL_INTERVAL = "1s"  # 처리 중인 작업 진행률 갱신 주기
 
 @st.cache_resource
 def initialize_components():
@@ -172,13 +170,15 @@ def initialize_components():
         doc_processor = DocumentProcessor()
         vector_store = VectorStore()
         chat_handler = ChatHandler(vector_store)
+        ingest_queue = IngestQueue(doc_processor, vector_store)
+        ingest_queue.start()
         
         logger.info("Components initialized successfully")
-        return doc_processor, vector_store, chat_handler
+        return doc_processor, vector_store, chat_handler, ingest_queue
     except Exception as e:
         logger.error(f"Failed to initialize components: {str(e)}")
         st.error(f"초기화 중 오류가 발생했습니다: {str(e)}")
-        return None, None, None
+        return None, None, None, None
 
 def allowed_file(filename):
     """허용된 파일 확장자 확인"""
@@ -190,18 +190,170 @@ def generate_session_id():
         st.session_state.session_id = str(uuid.uuid4())
     return st.session_state.session_id
 
+@st.cache_data(show_spinner=False)
+def load_document_stats(_vector_store):
+    """문서 목록/통계 캐시. 재실행마다 조회하지 않고 업로드·삭제 시에만 무효화"""
+    return _vector_store.get_document_stats()
+
+def _invalidate_document_cache(document_name, change):
+    # 인제스트 워커 스레드에서도 호출되므로 세션 상태 대신 전역 캐시만 비움
+    load_document_stats.clear()
+
+@st.cache_resource
+def register_cache_invalidation(_vector_store):
+    _vector_store.add_change_listener(_invalidate_document_cache)
+    return True
+
+@st.fragment
+def upload_panel(ingest_queue):
+    """파일 업로드 (업로드 위젯 조작은 이 영역만 다시 실행)"""
+    uploaded_file = st.file_uploader(
+        "📄 문서 업로드",
+        type=['pdf', 'txt'],
+        help="PDF 또는 TXT 파일을 업로드하세요 (최대 16MB)"
+    )
+    
+    if uploaded_file is not None:
+        if uploaded_file.size > MAX_FILE_SIZE:
+            st.error(f"파일 크기가 너무 큽니다. 최대 {MAX_FILE_SIZE // (1024*1024)}MB까지 업로드 가능합니다.")
+        elif allowed_file(uploaded_file.name):
+            # 같은 업로드가 재실행마다 다시 등록되지 않도록 파일별로 한 번만 작업 생성
+            upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+            if upload_key not in st.session_state.ingest_jobs:
+                try:
+                    file_path = os.path.join('documents', uploaded_file.name)
+                    uploaded_file.seek(0)
+                    staged_path, content_hash = stage_stream(uploaded_file, file_path)
+                    
+                    # 같은 내용의 파일이 이미 색인돼 있으면 작업이 추출 없이 바로 완료되고 임시 파일은 지워짐
+                    st.session_state.ingest_jobs[upload_key] = ingest_queue.enqueue(
+                        staged_path, uploaded_file.name, content_hash=content_hash, target_path=file_path
+                    )
+                except Exception as e:
+                    st.error(f"문서 처리 중 오류가 발생했습니다: {str(e)}")
+                    logger.error(f"Document processing error: {str(e)}")
+        else:
+            st.error("지원하지 않는 파일 형식입니다. PDF 또는 TXT 파일만 업로드 가능합니다.")
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def ingest_progress(ingest_queue):
+    """백그라운드 처리 작업 진행 상황 (이 영역만 주기적으로 갱신)"""
+    for upload_key, job_id in st.session_state.ingest_jobs.items():
+        job = ingest_queue.get_status(job_id)
+        if job is None:
+            continue
+        if job['status'] in ('queued', 'running'):
+            total = job['chunks_total'] or 1
+            st.progress(
+                job['chunks_written'] / total,
+                text=f"📄 {job['document_name']} 처리 중 (페이지 {job['pages_extracted']}/{job['pages_total'] or '?'}, "
+                     f"임베딩 {job['chunks_embedded']}/{job['chunks_total'] or '?'})"
+            )
+            if st.button("취소", key=f"cancel_{job_id}"):
+                ingest_queue.cancel(job_id)
+            continue
+        
+        if job['status'] == 'completed':
+            if job['duplicate_of']:
+                st.info(f"ℹ️ {job['document_name']}은(는) 이미 색인된 {job['duplicate_of']}와 같은 파일입니다.")
+            elif job['chunks_reused']:
+                st.success(f"✅ {job['document_name']} 업데이트 완료! "
+                           f"(재사용 {job['chunks_reused']}개, 새로 임베딩 {job['chunks_total'] - job['chunks_reused']}개)")
+            else:
+                st.success(f"✅ {job['document_name']} 업로드 완료!")
+        elif job['status'] == 'failed':
+            st.error(f"문서 처리 중 오류가 발생했습니다: {job['error']}")
+        elif job['status'] == 'cancelled':
+            st.info(f"{job['document_name']} 처리가 취소되었습니다.")
+        
+        # 작업이 끝난 직후 한 번만 전체를 다시 실행해 문서 목록/통계에 반영
+        if job_id not in st.session_state.finished_jobs:
+            st.session_state.finished_jobs.add(job_id)
+            st.rerun()
+
+@st.fragment
+def document_panel(vector_store):
+    """업로드된 문서 목록과 통계 (삭제 시 이 영역만 다시 실행)"""
+    st.markdown("### 📋 업로드된 문서")
+    try:
+        documents = [doc['source'] for doc in load_document_stats(vector_store)]
+    except Exception as e:
+        st.error(f"문서 목록을 가져오는 중 오류가 발생했습니다: {str(e)}")
+        documents = []
+    
+    if documents:
+        for doc in documents:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f'<div class="document-item">📄 {doc}</div>', unsafe_allow_html=True)
+            with col2:
+                if st.button("🗑️", key=f"delete_{doc}", help=f"{doc} 삭제"):
+                    try:
+                        vector_store.delete_document(doc)
+                        # 파일 시스템에서도 삭제
+                        file_path = os.path.join('documents', doc)
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+                        st.success(f"{doc} 삭제 완료!")
+                        st.rerun(scope="fragment")
+                    except Exception as e:
+                        st.error(f"문서 삭제 중 오류: {str(e)}")
+    else:
+        st.info("업로드된 문서가 없습니다.")
+    
+    st.markdown("### 📊 통계")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(f'<div class="metric-card"><h3>{len(documents)}</h3><p>문서</p></div>', unsafe_allow_html=True)
+    with col2:
+        st.markdown(f'<div class="metric-card"><h3>{len(st.session_state.messages)}</h3><p>메시지</p></div>',
+                    unsafe_allow_html=True)
+
+def render_message(message):
+    if message["role"] == "user":
+        st.markdown(f'<div class="user-message">👤 {message["content"]}</div>', unsafe_allow_html=True)
+    else:
+        st.markdown(f'<div class="assistant-message">🤖 {message["content"]}</div>', unsafe_allow_html=True)
+        # 출처 정보 표시
+        if "sources" in message and message["sources"]:
+            with st.expander("📚 참고한 문서"):
+                for source in message["sources"]:
+                    st.write(f"• {source}")
+
+@st.fragment
+def chat_transcript():
+    """최근 메시지만 그리고, 이전 메시지는 '이전 대화 더 보기'로 페이지 단위로 펼침"""
+    messages = st.session_state.messages
+    visible = st.session_state.transcript_pages * TRANSCRIPT_PAGE_SIZE
+    hidden = max(len(messages) - visible, 0)
+    if hidden:
+        if st.button(f"⬆️ 이전 대화 더 보기 ({hidden}개)", key="show_older_messages"):
+            st.session_state.transcript_pages += 1
+            st.rerun(scope="fragment")
+    for message in messages[hidden:]:
+        render_message(message)
+
 def main():
     # 컴포넌트 초기화
-    doc_processor, vector_store, chat_handler = initialize_components()
-    if not all([doc_processor, vector_store, chat_handler]):
+    doc_processor, vector_store, chat_handler, ingest_queue = initialize_components()
+    if not all([doc_processor, vector_store, chat_handler, ingest_queue]):
         st.error("애플리케이션 초기화에 실패했습니다.")
         return
+    register_cache_invalidation(vector_store)
     
     # 세션 상태 초기화
     if 'messages' not in st.session_state:
         st.session_state.messages = []
     if 'session_id' not in st.session_state:
         st.session_state.session_id = generate_session_id()
+    if 'ingest_jobs' not in st.session_state:
+        st.session_state.ingest_jobs = {}
+    if 'finished_jobs' not in st.session_state:
+        st.session_state.finished_jobs = set()
+    if 'transcript_pages' not in st.session_state:
+        st.session_state.transcript_pages = 1
+    
+    st.markdown(APP_CSS, unsafe_allow_html=True)
     
     # 메인 헤더
     st.markdown("""
@@ -211,73 +363,14 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # 사이드바
+    # 사이드바 (각 영역은 fragment라 위젯 조작 시 해당 영역만 다시 실행됨)
     with st.sidebar:
-        st.markdown('<div class="sidebar-container">', unsafe_allow_html=True)
         st.markdown("### 📂 문서 관리")
-        
-        # 파일 업로드
-        uploaded_file = st.file_uploader(
-            "📄 문서 업로드",
-            type=['pdf', 'txt'],
-            help="PDF 또는 TXT 파일을 업로드하세요 (최대 16MB)"
-        )
-        
-        if uploaded_file is not None:
-            if uploaded_file.size > MAX_FILE_SIZE:
-                st.error(f"파일 크기가 너무 큽니다. 최대 {MAX_FILE_SIZE // (1024*1024)}MB까지 업로드 가능합니다.")
-            elif allowed_file(uploaded_file.name):
-                with st.spinner("문서를 처리하고 있습니다..."):
-                    try:
-                        # 파일 저장
-                        file_path = os.path.join('documents', uploaded_file.name)
-                        with open(file_path, 'wb') as f:
-                            f.write(uploaded_file.getbuffer())
-                        
-                        # 문서 처리
-                        chunks = doc_processor.process_document(file_path)
-                        
-                        if len(chunks) > 400:
-                            st.error(f"파일이 너무 큽니다: {len(chunks)}개 청크 (최대 400개)")
-                            os.remove(file_path)
-                        else:
-                            # 벡터 스토어에 추가
-                            vector_store.add_documents(chunks, uploaded_file.name)
-                            st.success(f"✅ {uploaded_file.name} 업로드 완료!")
-                            st.rerun()
-                    except Exception as e:
-                        st.error(f"문서 처리 중 오류가 발생했습니다: {str(e)}")
-                        logger.error(f"Document processing error: {str(e)}")
-            else:
-                st.error("지원하지 않는 파일 형식입니다. PDF 또는 TXT 파일만 업로드 가능합니다.")
+        upload_panel(ingest_queue)
+        ingest_progress(ingest_queue)
         
         st.markdown("---")
-        
-        # 업로드된 문서 목록
-        st.markdown("### 📋 업로드된 문서")
-        try:
-            documents = vector_store.list_documents()
-            if documents:
-                for doc in documents:
-                    col1, col2 = st.columns([3, 1])
-                    with col1:
-                        st.markdown(f'<div class="document-item">📄 {doc}</div>', unsafe_allow_html=True)
-                    with col2:
-                        if st.button("🗑️", key=f"delete_{doc}", help=f"{doc} 삭제"):
-                            try:
-                                vector_store.delete_document(doc)
-                                # 파일 시스템에서도 삭제
-                                file_path = os.path.join('documents', doc)
-                                if os.path.exists(file_path):
-                                    os.remove(file_path)
-                                st.success(f"{doc} 삭제 완료!")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"문서 삭제 중 오류: {str(e)}")
-            else:
-                st.info("업로드된 문서가 없습니다.")
-        except Exception as e:
-            st.error(f"문서 목록을 가져오는 중 오류가 발생했습니다: {str(e)}")
+        document_panel(vector_store)
         
         st.markdown("---")
         
@@ -285,40 +378,13 @@ def main():
         if st.button("🔄 대화 초기화", use_container_width=True):
             chat_handler.clear_conversation(st.session_state.session_id)
             st.session_state.messages = []
+            st.session_state.transcript_pages = 1
             st.success("대화가 초기화되었습니다!")
             st.rerun()
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # 통계 정보
-        st.markdown("### 📊 통계")
-        try:
-            doc_count = len(vector_store.list_documents())
-            message_count = len(st.session_state.messages)
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown(f'<div class="metric-card"><h3>{doc_count}</h3><p>문서</p></div>', unsafe_allow_html=True)
-            with col2:
-                st.markdown(f'<div class="metric-card"><h3>{message_count}</h3><p>메시지</p></div>', unsafe_allow_html=True)
-        except:
-            pass
     
     # 메인 채팅 영역
     st.markdown('<div class="chat-container">', unsafe_allow_html=True)
-    
-    # 채팅 기록 표시
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f'<div class="user-message">👤 {message["content"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="assistant-message">🤖 {message["content"]}</div>', unsafe_allow_html=True)
-            # 출처 정보 표시
-            if "sources" in message and message["sources"]:
-                with st.expander("📚 참고한 문서"):
-                    for source in message["sources"]:
-                        st.write(f"• {source}")
-    
+    chat_transcript()
     st.markdown('</div>', unsafe_allow_html=True)
     
     # 채팅 입력
@@ -326,25 +392,28 @@ def main():
         # 사용자 메시지 추가
         st.session_state.messages.append({"role": "user", "content": prompt})
         
-        # 채팅 영역 업데이트
-        with st.spinner("답변을 생성하고 있습니다..."):
-            try:
-                response, sources = chat_handler.get_response(prompt, st.session_state.session_id)
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": response,
-                    "sources": sources
-                })
-            except Exception as e:
-                error_msg = f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}"
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": error_msg,
-                    "sources": []
-                })
-                logger.error(f"Chat error: {str(e)}")
+        st.markdown(f'<div class="user-message">👤 {prompt}</div>', unsafe_allow_html=True)
+        
+        # 검색이 끝나는 즉시 응답을 토큰 단위로 스트리밍
+        try:
+            with st.spinner("관련 문서를 찾고 있습니다..."):
+                sources, deltas = chat_handler.stream_response(prompt, st.session_state.session_id)
+            response = st.write_stream(deltas)
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": response,
+                "sources": sources
+            })
+        except Exception as e:
+            error_msg = f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}"
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": error_msg,
+                "sources": []
+            })
+            logger.error(f"Chat error: {str(e)}")
         
         st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
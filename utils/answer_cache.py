@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.metrics import metrics
+
+class SemanticAnswerCache:
+    """질문 임베딩의 코사인 유사도로 이전 답변을 재사용하는 캐시 (TTL + LRU)"""
+
+    def __init__(self, threshold=0.95, max_entries=1000, ttl_seconds=24 * 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # entry_id -> dict
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float):
+        expired = [entry_id for entry_id, entry in self._entries.items()
+                   if now - entry["created_at"] > self.ttl_seconds]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self.evictions += len(expired)
+
+    def lookup(self, query_embedding: List[float], scope: str = "") -> Optional[Dict]:
+        """scope(예: 검색 대상 테넌트)가 같은 답변 중에서만 찾음"""
+        now = time.time()
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._expire(now)
+            entry_ids = [entry_id for entry_id, entry in self._entries.items() if entry["scope"] == scope]
+            if not entry_ids:
+                self.misses += 1
+                metrics.cache_events.inc(cache="answer", result="miss")
+                return None
+
+            matrix = np.stack([self._entries[entry_id]["embedding"] for entry_id in entry_ids])
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                metrics.cache_events.inc(cache="answer", result="miss")
+                return None
+
+            entry = self._entries[entry_ids[best]]
+            self._entries.move_to_end(entry_ids[best])
+            entry["hits"] += 1
+            self.hits += 1
+            metrics.cache_events.inc(cache="answer", result="hit")
+            self.saved_seconds += entry["latency"]
+            return {
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "sources": list(entry["sources"]),
+                "similarity": float(similarities[best]),
+            }
+
+    def store(self, question: str, query_embedding: List[float], answer: str,
+              sources: List[str], latency: float, scope: str = ""):
+        with self._lock:
+            self._entries[self._next_id] = {
+                "question": question,
+                "scope": scope,
+                "embedding": self._normalize(query_embedding),
+                "answer": answer,
+                "sources": list(sources),
+                "latency": latency,
+                "created_at": time.time(),
+                "hits": 0,
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_source(self, source: str, include_unsourced=False):
+        """해당 문서를 출처로 사용한 답변 제거 (include_unsourced면 출처 없는 답변도 제거)"""
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if source in entry["sources"] or (include_unsourced and not entry["sources"])]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": len(self._entries),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
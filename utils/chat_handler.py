@@ -1,44 +1,24 @@
 import openai
+import asyncio
 import os
 import json
+import logging
+import time
+import threading
 from utils.vector_store import VectorStore
-from typing import List, Dict, Tuple
+from utils.prompt_builder import PromptBuilder
+from utils.token_counter import count_tokens
+from utils.answer_cache import SemanticAnswerCache
+from utils.session_store import SessionStore, create_session_store
+from utils.reranker import Reranker, create_reranker
+from utils.embedding_cache import EmbeddingCache
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight, AsyncSingleFlight
+from typing import List, Dict, Optional, Tuple, Iterator, AsyncIterator
 
-class ChatHandler:
-    def __init__(self, vector_store: VectorStore):
-        self.vector_store = vector_store
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        self.model = "gpt-3.5-turbo"
-        self.conversation_sessions = {}
-    
-    def get_response(self, user_message: str, session_id: str = "default") -> Tuple[str, List[str]]:
-        if session_id not in self.conversation_sessions:
-            self.conversation_sessions[session_id] = []
-        
-        relevant_docs = self.vector_store.search(user_message, n_results=8)
-        
-        # 출처 정보 수집 및 관련도 기반 컨텍스트 구성
-        sources = []
-        context = ""
-        doc_relevance_scores = {}
-        
-        for i, doc in enumerate(relevant_docs):
-            source_name = doc['metadata']['source']
-            if source_name not in sources:
-                sources.append(source_name)
-            
-            # 관련도 점수 계산 (상위 결과일수록 높은 점수)
-            relevance_score = (len(relevant_docs) - i) / len(relevant_docs)
-            
-            # 문서별 관련도 점수 누적
-            if source_name not in doc_relevance_scores:
-                doc_relevance_scores[source_name] = 0
-            doc_relevance_scores[source_name] += relevance_score
-            
-            context += f"🔍 **출처: {source_name}** (관련도: {relevance_score:.2f})\n"
-            context += f"📝 내용: {doc['document']}\n\n"
-        
-        system_prompt = """안녕하세요! 저는 여러분의 문서를 꼼꼼히 살펴보고 친근하게 도와드리는 AI 어시스턴트입니다. 😊
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """안녕하세요! 저는 여러분의 문서를 꼼꼼히 살펴보고 친근하게 도와드리는 AI 어시스턴트입니다. 😊
 
 제가 도와드릴 때 이런 점들을 중요하게 생각해요:
 - 업로드하신 문서 내용에서 질문하신 내용과 정확히 일치하는 부분을 우선적으로 찾아서 답변드려요
@@ -48,51 +28,419 @@ class ChatHandler:
 - 답변은 마크다운 형식으로 깔끔하게 정리해드려요
 
 만약 문서에서 관련 정보를 찾을 수 없다면 솔직하게 말씀드릴게요. 궁금한 것이 있으시면 언제든지 편하게 물어보세요!"""
+
+SUMMARY_PROMPT = """다음은 사용자와 AI 어시스턴트의 이전 대화입니다. 이후 대화에 필요한 사실(질문 주제, 언급된 제도/금액/조건 등)만 남겨 5문장 이내로 요약해주세요."""
+
+class ChatHandler:
+    def __init__(self, vector_store: VectorStore, answer_cache: SemanticAnswerCache = None,
+                 session_store: SessionStore = None, reranker: Reranker = None):
+        self.vector_store = vector_store
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        self.model = "gpt-3.5-turbo"
+        # 키워드+벡터 하이브리드 검색 후 MMR/인접 청크 병합으로 적은 수의 구절만 프롬프트에 포함
+        self.n_results = 5
+        # 거리 컷오프는 임베딩 모델마다 기준이 달라 VectorStore가 모델에 맞게 정함 (RETRIEVAL_MAX_DISTANCE로 고정 가능)
+        self.retrieval_options = {
+            'mmr_lambda': float(os.getenv('RETRIEVAL_MMR_LAMBDA', 0.7)),
+        }
+        # 재정렬 단계(RERANKER)가 켜져 있으면 후보를 더 넓게 가져와 상위 top_k개만 LLM에 전달
+        self.reranker = reranker or create_reranker()
+        self.rerank_candidates = int(os.getenv('RERANK_CANDIDATES', 12))
+        # 세션별 최근 10개 턴만 보관 (SESSION_STORE=sqlite면 여러 워커 프로세스가 공유)
+        self.session_store = session_store or create_session_store(max_turns=10)
+        self._async_client = None
         
-        messages = [{"role": "system", "content": system_prompt}]
+        # 토큰 예산 기반 프롬프트 구성 및 요청별 토큰 사용량 집계
+        self.prompt_builder = PromptBuilder(
+            model=self.model,
+            max_prompt_tokens=int(os.getenv('PROMPT_TOKEN_BUDGET', 2500)),
+            history_budget=int(os.getenv('HISTORY_TOKEN_BUDGET', 600))
+        )
+        self.token_stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "last_request": {}}
+        self._stats_lock = threading.Lock()
+        self._summarizing = set()
+        self._summarizing_lock = threading.Lock()
         
-        # 이전 대화 내역 추가 (최대 10개 턴)
-        conversation_history = self.conversation_sessions[session_id][-10:]
-        for turn in conversation_history:
-            messages.append({"role": "user", "content": turn["user"]})
-            messages.append({"role": "assistant", "content": turn["assistant"]})
+        # 반복되는 질문은 질문 임베딩 유사도로 이전 답변을 재사용
+        self.answer_cache = answer_cache or SemanticAnswerCache(
+            threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95)),
+            ttl_seconds=int(os.getenv('ANSWER_CACHE_TTL', 24 * 3600))
+        )
+        self.vector_store.add_change_listener(self._on_document_change)
         
-        user_prompt = f"""📄 **업로드하신 문서에서 찾은 관련 내용:**
-
-{context}
-
-💬 **질문:** {user_message}
-
-위 문서 내용에서 질문과 정확히 일치하는 부분이 있다면 그 내용을 중심으로 자세히 답변해주세요. 문서의 구체적인 정보를 최대한 활용해서 정확하고 친근하게 설명해주세요!"""
+        # 공지 직후처럼 같은 질문이 동시에 몰리면 진행 중인 임베딩/검색/완성 한 번을 공유 (CHAT_COALESCING=false로 끔)
+        self.coalescing = os.getenv('CHAT_COALESCING', 'true').lower() != 'false'
+        self._flights = SingleFlight("chat")
+        self._stream_flights = SingleFlight("chat_stream")
+        self._async_flights = AsyncSingleFlight("chat")
+        self._async_stream_flights = AsyncSingleFlight("chat_stream")
+    
+    def _on_document_change(self, document_name: str, change: str):
+        # 새 문서가 추가되면 '관련 문서 없음' 답변도 더 이상 유효하지 않음
+        self.answer_cache.invalidate_source(document_name, include_unsourced=(change == 'added'))
+    
+    def _is_standalone(self, session_id: str) -> bool:
+        # 이전 대화 맥락 없이 만든 답변만 캐시에 저장하고 세션 간에 공유.
+        # 긴 턴 하나가 통째로 요약돼 내역이 비어도 요약문이 프롬프트에 들어가므로 요약도 없어야 함
+        return not self.session_store.get_history(session_id) and not self.session_store.get_summary(session_id)
+    
+    @staticmethod
+    def _cache_scope(tenants: List[str] = None) -> str:
+        # 검색 대상 테넌트가 다르면 같은 질문이라도 답변이 달라지므로 캐시를 분리
+        return ",".join(sorted(set(tenants))) if tenants else "*"
+    
+    def _store_answer(self, user_message: str, query_embedding: List[float], answer: str,
+                      sources: List[str], started_at: float, standalone: bool, tenants: List[str] = None):
+        if standalone:
+            self.answer_cache.store(user_message, query_embedding, answer, sources, time.time() - started_at,
+                                    self._cache_scope(tenants))
+    
+    def get_cache_stats(self) -> Dict:
+        return self.answer_cache.stats()
+    
+    def _retrieve(self, user_message: str, query_embedding: List[float], tenants: List[str] = None) -> List[dict]:
+        n_results = self.rerank_candidates if self.reranker else self.n_results
+        with metrics.span("retrieve"):
+            relevant_docs = self.vector_store.retrieve(user_message, n_results=n_results,
+                                                       query_embedding=query_embedding, tenants=tenants,
+                                                       **self.retrieval_options)
+        if self.reranker:
+            with metrics.span("rerank"):
+                relevant_docs = self.reranker.rerank(user_message, relevant_docs)
+        return relevant_docs
+    
+    async def _aretrieve(self, user_message: str, query_embedding: List[float],
+                         tenants: List[str] = None) -> List[dict]:
+        n_results = self.rerank_candidates if self.reranker else self.n_results
+        with metrics.span("retrieve"):
+            relevant_docs = await self.vector_store.aretrieve(user_message, n_results=n_results,
+                                                              query_embedding=query_embedding, tenants=tenants,
+                                                              **self.retrieval_options)
+        if self.reranker:
+            # CPU 추론이 이벤트 루프를 막지 않도록 스레드에서 실행
+            with metrics.span("rerank"):
+                relevant_docs = await asyncio.to_thread(self.reranker.rerank, user_message, relevant_docs)
+        return relevant_docs
+    
+    def get_rerank_stats(self) -> Dict:
+        return self.reranker.stats() if self.reranker else {"enabled": False}
+    
+    def _build_messages(self, user_message: str, session_id: str, relevant_docs: List[dict]) -> Tuple[List[Dict], List[str]]:
+        history = self.session_store.get_history(session_id)
+        summary = self.session_store.get_summary(session_id)
+        with metrics.span("prompt_build"):
+            messages, sorted_sources, usage = self.prompt_builder.build(
+                SYSTEM_PROMPT, user_message, relevant_docs, history, summary
+            )
+        metrics.tokens.inc(usage["total"], kind="prompt")
+        with self._stats_lock:
+            self.token_stats["requests"] += 1
+            self.token_stats["prompt_tokens"] += usage["total"]
+            self.token_stats["last_request"] = usage
+        return messages, sorted_sources
+    
+    def _record_completion_tokens(self, completion_tokens: int):
+        metrics.tokens.inc(completion_tokens, kind="completion")
+        with self._stats_lock:
+            self.token_stats["completion_tokens"] += completion_tokens
+            self.token_stats["last_request"]["completion"] = completion_tokens
+    
+    def get_token_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.token_stats)
+        stats["avg_prompt_tokens"] = stats["prompt_tokens"] / stats["requests"] if stats["requests"] else 0
+        return stats
+    
+    def _maybe_compact(self, session_id: str):
+        """예산 밖으로 밀려난 오래된 턴을 요약문으로 압축 (응답 경로를 막지 않도록 별도 스레드에서 실행)"""
+        history = self.session_store.get_history(session_id)
+        kept_turns, _ = self.prompt_builder.fit_history(history)
+        drop_turns = len(history) - kept_turns
+        if len(history) >= self.session_store.max_turns:
+            drop_turns = max(drop_turns, len(history) // 2)
+        if drop_turns <= 0:
+            return
+        with self._summarizing_lock:
+            if session_id in self._summarizing:
+                return
+            self._summarizing.add(session_id)
+        # 요약 중에 새 턴이 들어와 창이 밀려도 실제로 요약한 턴만 지우도록 식별자를 고정
+        summarized = history[:drop_turns]
+        
+        def summarize():
+            try:
+                previous = self.session_store.get_summary(session_id)
+                transcript = "\n".join(f"사용자: {turn['user']}\n어시스턴트: {turn['assistant']}"
+                                       for turn in summarized)
+                if previous:
+                    transcript = f"기존 요약: {previous}\n\n{transcript}"
+                response = openai.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": transcript}
+                    ],
+                    temperature=0,
+                    max_tokens=self.prompt_builder.summary_budget
+                )
+                self.session_store.compact(session_id, [self.session_store.turn_key(turn) for turn in summarized],
+                                           response.choices[0].message.content)
+            except Exception:
+                logger.exception("Conversation summary failed")
+            finally:
+                with self._summarizing_lock:
+                    self._summarizing.discard(session_id)
+        
+        threading.Thread(target=summarize, daemon=True).start()
+    
+    def _save_turn(self, session_id: str, user_message: str, assistant_response: str):
+        self.session_store.append_turn(session_id, user_message, assistant_response)
+        self._maybe_compact(session_id)
+    
+    def _flight_key(self, user_message: str, tenants: List[str] = None) -> str:
+        # 정규화한 질문과 검색 설정이 같으면 같은 프롬프트가 만들어지므로 하나의 실행을 공유할 수 있음
+        return json.dumps([EmbeddingCache.normalize(user_message), self._cache_scope(tenants), self.model,
+                           self.n_results, self.rerank_candidates if self.reranker else None,
+                           sorted(self.retrieval_options.items())], ensure_ascii=False)
+    
+    def _coalesces(self, standalone: bool) -> bool:
+        # 이전 대화가 있는 요청은 프롬프트가 세션마다 달라 합칠 수 없음
+        return self.coalescing and standalone
+    
+    def get_response(self, user_message: str, session_id: str = "default",
+                     tenants: List[str] = None) -> Tuple[str, List[str]]:
+        started_at = time.time()
+        standalone = self._is_standalone(session_id)
+        answer = lambda: self._answer(user_message, session_id, tenants, standalone, started_at)
+        if self._coalesces(standalone):
+            assistant_response, sources, cached = self._flights.do(self._flight_key(user_message, tenants), answer)
+        else:
+            assistant_response, sources, cached = answer()
+        if cached is None:
+            return assistant_response, sources
+        
+        # 대화 내역에 추가
+        self._save_turn(session_id, user_message, assistant_response)
+        metrics.observe("chat_total", time.time() - started_at, cached="true" if cached else "false")
+        return assistant_response, sources
+    
+    def _answer(self, user_message: str, session_id: str, tenants: List[str], standalone: bool,
+                started_at: float) -> Tuple[str, List[str], Optional[bool]]:
+        """(답변, 출처, 답변 캐시 적중 여부). 완성 API 오류면 오류 안내문과 함께 None"""
+        query_embedding = self.vector_store.embed_query(user_message)
         
-        messages.append({"role": "user", "content": user_prompt})
+        with metrics.span("answer_cache_lookup"):
+            cached = self.answer_cache.lookup(query_embedding, self._cache_scope(tenants))
+        if cached:
+            return cached["answer"], cached["sources"], True
+        
+        relevant_docs = self._retrieve(user_message, query_embedding, tenants)
+        messages, sorted_sources = self._build_messages(user_message, session_id, relevant_docs)
         
         try:
-            response = openai.chat.completions.create(
+            with metrics.span("completion"):
+                response = openai.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1500
+                )
+        except Exception as e:
+            return f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}", [], None
+        
+        assistant_response = response.choices[0].message.content
+        if response.usage:
+            self._record_completion_tokens(response.usage.completion_tokens)
+        self._store_answer(user_message, query_embedding, assistant_response, sorted_sources,
+                           started_at, standalone, tenants)
+        return assistant_response, sorted_sources, False
+    
+    def stream_response(self, user_message: str, session_id: str = "default",
+                        tenants: List[str] = None) -> Tuple[List[str], Iterator[str]]:
+        """검색까지 마친 뒤 (출처, 응답 조각 제너레이터)를 반환"""
+        started_at = time.time()
+        standalone = self._is_standalone(session_id)
+        prepare = lambda: self._prepare_stream(user_message, session_id, tenants, standalone, started_at)
+        if self._coalesces(standalone):
+            # 같은 질문이 동시에 들어오면 하나의 완성 스트림을 모든 요청에 나눠 보냄
+            (sources, cached), deltas = self._stream_flights.stream(self._flight_key(user_message, tenants), prepare)
+        else:
+            (sources, cached), deltas = prepare()
+        return sources, self._finish_stream(deltas, user_message, session_id, started_at, cached)
+    
+    def _prepare_stream(self, user_message: str, session_id: str, tenants: List[str], standalone: bool,
+                        started_at: float) -> Tuple[Tuple[List[str], bool], Iterator[str]]:
+        """((출처, 답변 캐시 적중 여부), 응답 조각 제너레이터). 토큰 집계와 답변 캐시 저장은 스트림당 한 번"""
+        query_embedding = self.vector_store.embed_query(user_message)
+        
+        with metrics.span("answer_cache_lookup"):
+            cached = self.answer_cache.lookup(query_embedding, self._cache_scope(tenants))
+        if cached:
+            return (cached["sources"], True), iter([cached["answer"]])
+        
+        relevant_docs = self._retrieve(user_message, query_embedding, tenants)
+        messages, sorted_sources = self._build_messages(user_message, session_id, relevant_docs)
+        
+        def generate():
+            chunks = []
+            requested_at = time.perf_counter()
+            stream = openai.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=0.7,
-                max_tokens=1500
+                max_tokens=1500,
+                stream=True
             )
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not chunks:
+                        metrics.observe("completion_first_token", time.perf_counter() - requested_at)
+                    chunks.append(delta)
+                    yield delta
             
-            assistant_response = response.choices[0].message.content
-            
-            # 대화 내역에 추가
-            self.conversation_sessions[session_id].append({
-                "user": user_message,
-                "assistant": assistant_response
-            })
+            metrics.observe("completion", time.perf_counter() - requested_at)
+            assistant_response = "".join(chunks)
+            self._record_completion_tokens(count_tokens(assistant_response, self.model))
+            self._store_answer(user_message, query_embedding, assistant_response, sorted_sources,
+                               started_at, standalone, tenants)
+        
+        return (sorted_sources, False), generate()
+    
+    def _finish_stream(self, deltas: Iterator[str], user_message: str, session_id: str,
+                       started_at: float, cached: bool) -> Iterator[str]:
+        chunks = []
+        for delta in deltas:
+            chunks.append(delta)
+            yield delta
+        
+        # 스트림이 끝까지 전달된 경우에만 대화 내역에 추가
+        self._save_turn(session_id, user_message, "".join(chunks))
+        metrics.observe("chat_total", time.time() - started_at, cached="true" if cached else "false")
+    
+    def _get_async_client(self):
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=openai.api_key)
+        return self._async_client
+    
+    async def aget_response(self, user_message: str, session_id: str = "default",
+                            tenants: List[str] = None) -> Tuple[str, List[str]]:
+        started_at = time.time()
+        standalone = self._is_standalone(session_id)
+        answer = lambda: self._aanswer(user_message, session_id, tenants, standalone, started_at)
+        if self._coalesces(standalone):
+            assistant_response, sources, cached = await self._async_flights.do(
+                self._flight_key(user_message, tenants), answer
+            )
+        else:
+            assistant_response, sources, cached = await answer()
+        if cached is None:
+            return assistant_response, sources
+        
+        self._save_turn(session_id, user_message, assistant_response)
+        metrics.observe("chat_total", time.time() - started_at, cached="true" if cached else "false")
+        return assistant_response, sources
+    
+    async def _aanswer(self, user_message: str, session_id: str, tenants: List[str], standalone: bool,
+                       started_at: float) -> Tuple[str, List[str], Optional[bool]]:
+        query_embedding = await self.vector_store.aembed_query(user_message)
+        
+        with metrics.span("answer_cache_lookup"):
+            cached = self.answer_cache.lookup(query_embedding, self._cache_scope(tenants))
+        if cached:
+            return cached["answer"], cached["sources"], True
+        
+        relevant_docs = await self._aretrieve(user_message, query_embedding, tenants)
+        messages, sorted_sources = self._build_messages(user_message, session_id, relevant_docs)
+        
+        try:
+            with metrics.span("completion"):
+                response = await self._get_async_client().chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=1500
+                )
+        except Exception as e:
+            return f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}", [], None
+        
+        assistant_response = response.choices[0].message.content
+        if response.usage:
+            self._record_completion_tokens(response.usage.completion_tokens)
+        self._store_answer(user_message, query_embedding, assistant_response, sorted_sources,
+                           started_at, standalone, tenants)
+        return assistant_response, sorted_sources, False
+    
+    async def astream_response(self, user_message: str, session_id: str = "default",
+                               tenants: List[str] = None) -> Tuple[List[str], AsyncIterator[str]]:
+        started_at = time.time()
+        standalone = self._is_standalone(session_id)
+        prepare = lambda: self._aprepare_stream(user_message, session_id, tenants, standalone, started_at)
+        if self._coalesces(standalone):
+            (sources, cached), deltas = await self._async_stream_flights.stream(
+                self._flight_key(user_message, tenants), prepare
+            )
+        else:
+            (sources, cached), deltas = await prepare()
+        return sources, self._afinish_stream(deltas, user_message, session_id, started_at, cached)
+    
+    async def _aprepare_stream(self, user_message: str, session_id: str, tenants: List[str], standalone: bool,
+                               started_at: float) -> Tuple[Tuple[List[str], bool], AsyncIterator[str]]:
+        query_embedding = await self.vector_store.aembed_query(user_message)
+        
+        with metrics.span("answer_cache_lookup"):
+            cached = self.answer_cache.lookup(query_embedding, self._cache_scope(tenants))
+        if cached:
+            async def replay():
+                yield cached["answer"]
             
-            # 관련도 점수가 높은 출처 순으로 정렬
-            sorted_sources = sorted(sources, key=lambda x: doc_relevance_scores.get(x, 0), reverse=True)
-            return assistant_response, sorted_sources
+            return (cached["sources"], True), replay()
+        
+        relevant_docs = await self._aretrieve(user_message, query_embedding, tenants)
+        messages, sorted_sources = self._build_messages(user_message, session_id, relevant_docs)
+        
+        async def generate():
+            chunks = []
+            requested_at = time.perf_counter()
+            stream = await self._get_async_client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1500,
+                stream=True
+            )
+            async for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not chunks:
+                        metrics.observe("completion_first_token", time.perf_counter() - requested_at)
+                    chunks.append(delta)
+                    yield delta
             
-        except Exception as e:
-            return f"죄송합니다. 응답 생성 중 오류가 발생했습니다: {str(e)}", []
+            metrics.observe("completion", time.perf_counter() - requested_at)
+            assistant_response = "".join(chunks)
+            self._record_completion_tokens(count_tokens(assistant_response, self.model))
+            self._store_answer(user_message, query_embedding, assistant_response, sorted_sources,
+                               started_at, standalone, tenants)
+        
+        return (sorted_sources, False), generate()
+    
+    async def _afinish_stream(self, deltas: AsyncIterator[str], user_message: str, session_id: str,
+                              started_at: float, cached: bool) -> AsyncIterator[str]:
+        chunks = []
+        async for delta in deltas:
+            chunks.append(delta)
+            yield delta
+        
+        self._save_turn(session_id, user_message, "".join(chunks))
+        metrics.observe("chat_total", time.time() - started_at, cached="true" if cached else "false")
     
     def clear_conversation(self, session_id: str = "default"):
-        if session_id in self.conversation_sessions:
-            self.conversation_sessions[session_id] = []
+        self.session_store.clear(session_id)
     
     def get_conversation_history(self, session_id: str = "default") -> List[Dict]:
-        return self.conversation_sessions.get(session_id, [])
\ No newline at end of file
+        return self.session_store.get_history(session_id)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import re
+from typing import Callable, Iterator, List, Tuple
+
+from utils.token_counter import count_tokens
+
+# 문장 경계: 종결 부호(.?!… 및 전각 부호) 뒤 공백, 또는 빈 줄(문단)
+# "1.5", "3.1절" 같은 숫자 속 마침표와 구분하기 위해 뒤따르는 공백을 요구하고, "1. " 같은 번호 뒤 마침표는 제외
+_SENTENCE_END = re.compile(r'(?:(?<=[?!。？！…])|(?<=\D\.))["\'”’)\]]*\s+|\n\s*\n')
+# 목록/조항 머리(예: "1.", "가.", "①", "-", "•")로 시작하는 줄은 앞 문장과 분리
+_LIST_ITEM = re.compile(r'\n(?=\s*(?:\d{1,3}[.)]|[가-하][.)]|[①-⑳]|[-•·▶□○■※]))')
+# 한도를 넘는 문장을 다시 나눌 때의 경계 (줄 → 어절)
+_FALLBACK_SPLITS = (re.compile(r'[^\n]*\n|[^\n]+$'), re.compile(r'\s*\S+\s*'))
+
+class Chunk:
+    __slots__ = ("text", "tokens", "page", "end_page", "char_start", "char_end")
+
+    def __init__(self, text: str, tokens: int, page: int, end_page: int, char_start: int, char_end: int):
+        self.text = text
+        self.tokens = tokens
+        self.page = page
+        self.end_page = end_page
+        self.char_start = char_start
+        self.char_end = char_end
+
+    def metadata(self) -> dict:
+        return {"page": self.page, "end_page": self.end_page,
+                "char_start": self.char_start, "char_end": self.char_end}
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """문장(또는 목록 항목, 문단) 단위 (시작, 끝) 구간. 구분 공백은 앞 문장에 포함되어 구간이 text 전체를 덮음"""
+    cuts = {match.end() for match in _SENTENCE_END.finditer(text)}
+    cuts.update(match.start() + 1 for match in _LIST_ITEM.finditer(text))
+    spans, start = [], 0
+    for cut in sorted(cuts):
+        if cut > start:
+            spans.append((start, cut))
+            start = cut
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+class SentenceChunker:
+    """한국어 문장 경계를 지키면서 토큰 수 기준으로 청크를 만드는 스트리밍 청커.
+    페이지 텍스트를 순서대로 받아 청크가 완성되는 즉시 내보내며, 청크마다 페이지/문자 오프셋을 기록"""
+
+    def __init__(self, chunk_tokens=500, overlap_tokens=100, model="text-embedding-ada-002",
+                 token_fn: Callable[[str], int] = None):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.token_fn = token_fn or (lambda text: count_tokens(text, model))
+
+    def _units(self, text: str, start: int, page: int, level: int = 0) -> Iterator[Tuple[str, int, int, int]]:
+        """(문장, 토큰 수, 문서 내 시작 오프셋, 페이지). 청크 한도보다 긴 문장은 줄 → 어절 → 글자 순으로 다시 나눔"""
+        tokens = self.token_fn(text)
+        if tokens <= self.chunk_tokens:
+            yield text, tokens, start, page
+            return
+        pieces = []
+        while len(pieces) <= 1 and level < len(_FALLBACK_SPLITS):
+            pieces = _FALLBACK_SPLITS[level].findall(text)
+            level += 1
+        if len(pieces) <= 1:
+            # 공백 없는 긴 문자열은 토큰 밀도에 비례한 글자 수로 자름
+            step = max(1, len(text) * self.chunk_tokens // tokens)
+            pieces = [text[i:i + step] for i in range(0, len(text), step)]
+        current, current_tokens, current_start, offset = "", 0, start, start
+        for piece in pieces:
+            piece_tokens = self.token_fn(piece)
+            if current and current_tokens + piece_tokens > self.chunk_tokens:
+                yield from self._units(current, current_start, page, level)
+                current, current_tokens, current_start = "", 0, offset
+            current += piece
+            current_tokens += piece_tokens
+            offset += len(piece)
+        if current:
+            yield from self._units(current, current_start, page, level)
+
+    def iter_units(self, pages: Iterator[Tuple[int, str]]) -> Iterator[Tuple[str, int, int, int]]:
+        """페이지를 문장 단위로 풀어냄. 페이지 끝에서 끊긴 문장은 다음 페이지 앞부분과 이어 붙임"""
+        carry, carry_start, carry_page = "", 0, None
+        max_carry = self.chunk_tokens * 4  # 문장 부호 없는 표/목록이 계속 이어질 때 재분할 비용 상한 (글자 수)
+        offset = 0  # 페이지를 "\n"으로 이어 붙인 문서 기준 오프셋
+        for page_number, page_text in pages:
+            if not page_text:
+                continue
+            if offset:
+                page_text = "\n" + page_text
+            text = carry + page_text
+            text_start = carry_start if carry else offset
+            offset += len(page_text)
+
+            spans = split_sentences(text)
+            tail_start, tail_end = spans[-1]
+            # 공백으로 끝나지 않은 마지막 구간은 문장이 다음 페이지로 이어질 수 있으므로 보류
+            unfinished = not text[tail_end - 1].isspace() and tail_end - tail_start < max_carry
+            if unfinished:
+                spans = spans[:-1]
+            for span_start, span_end in spans:
+                page = carry_page if carry and span_start < len(carry) else page_number
+                yield from self._units(text[span_start:span_end], text_start + span_start, page)
+            if unfinished:
+                carry_page = carry_page if carry and tail_start < len(carry) else page_number
+                carry, carry_start = text[tail_start:tail_end], text_start + tail_start
+            else:
+                carry, carry_page = "", None
+        if carry:
+            yield from self._units(carry, carry_start, carry_page)
+
+    def chunk_pages(self, pages: Iterator[Tuple[int, str]]) -> Iterator[Chunk]:
+        window: List[Tuple[str, int, int, int]] = []
+        window_tokens = 0
+        for unit in self.iter_units(pages):
+            if window and window_tokens + unit[1] > self.chunk_tokens:
+                yield self._make_chunk(window)
+                # 겹침: 직전 청크 끝에서 overlap_tokens 이내의 문장을 다음 청크 앞에 유지
+                kept, kept_tokens = [], 0
+                for previous in reversed(window):
+                    if kept_tokens + previous[1] > self.overlap_tokens or \
+                            kept_tokens + previous[1] + unit[1] > self.chunk_tokens:
+                        break
+                    kept.insert(0, previous)
+                    kept_tokens += previous[1]
+                window, window_tokens = kept, kept_tokens
+            window.append(unit)
+            window_tokens += unit[1]
+        if window and "".join(unit[0] for unit in window).strip():
+            yield self._make_chunk(window)
+
+    def _make_chunk(self, window) -> Chunk:
+        raw = "".join(unit[0] for unit in window)
+        text = raw.strip()
+        lead = len(raw) - len(raw.lstrip())
+        char_start = window[0][2] + lead
+        return Chunk(text, sum(unit[1] for unit in window), window[0][3], window[-1][3],
+                     char_start, char_start + len(text))
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk.text for chunk in self.chunk_pages(iter([(1, text)]))]
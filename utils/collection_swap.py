@@ -0,0 +1,52 @@
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# 테넌트 컬렉션 이름에는 '.'이 들어가지 않으므로 교체용 임시/백업 컬렉션과 겹치지 않음
+REBUILD_SUFFIX = ".rebuild"
+BACKUP_SUFFIX = ".backup"
+
+def _exists(client, name: str) -> bool:
+    try:
+        client.get_collection(name)
+        return True
+    except ValueError:
+        return False
+
+def _drop(client, name: str):
+    try:
+        client.delete_collection(name)
+    except ValueError:
+        pass
+
+def swap_collection(client, collection_name: str, rebuilt):
+    """다시 만든 컬렉션(rebuilt)을 collection_name으로 교체.
+    원본을 백업 이름으로 옮긴 뒤 새 컬렉션을 들여오고 마지막에 백업을 지우므로,
+    어느 단계에서 중단돼도 recover_collection으로 원본 또는 새 컬렉션 중 하나를 되살릴 수 있음"""
+    backup_name = collection_name + BACKUP_SUFFIX
+    _drop(client, backup_name)
+    client.get_collection(collection_name).modify(name=backup_name)
+    rebuilt.modify(name=collection_name)
+    _drop(client, backup_name)
+
+def recover_collection(client, collection_name: str) -> bool:
+    """중단된 교체의 잔여물 정리. 원본이 백업 이름으로만 남아 있으면 원래 이름으로 되돌림
+    (새 컬렉션 복사는 끝났더라도 항상 일관된 원본을 되살림). 진행 중일 수 있는 재구성 컬렉션(.rebuild)은 건드리지 않음"""
+    backup_name = collection_name + BACKUP_SUFFIX
+    restored = False
+    if _exists(client, backup_name):
+        if _exists(client, collection_name):
+            # 새 컬렉션이 이미 자리를 잡았고 백업 삭제만 남은 경우
+            _drop(client, backup_name)
+        else:
+            client.get_collection(backup_name).modify(name=collection_name)
+            restored = True
+            logger.warning(f"Restored collection '{collection_name}' from an interrupted swap")
+    return restored
+
+def recover_all(client) -> List[str]:
+    """클라이언트의 모든 컬렉션에 대해 recover_collection을 실행하고 되살린 이름을 반환"""
+    names = {collection.name for collection in client.list_collections()}
+    originals = {name[:-len(BACKUP_SUFFIX)] for name in names if name.endswith(BACKUP_SUFFIX)}
+    return [name for name in sorted(originals) if recover_collection(client, name)]
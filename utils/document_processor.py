@@ -1,57 +1,205 @@
+import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+import PyPDF2
 from PyPDF2 import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.chunker import SentenceChunker
+from utils.file_hash import hash_file
+from utils.metrics import metrics
+from utils.page_text_cache import PageCacheCorrupt, PageTextCache
+
+logger = logging.getLogger(__name__)
+
+# 추출 결과가 달라지는 변경(라이브러리 버전, 추출 로직)이 있으면 캐시된 페이지 텍스트를 다시 만들도록 키에 포함
+EXTRACTOR_VERSION = f"pypdf2-{PyPDF2.__version__}-1"
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    # 프로세스 풀 워커에서 실행: 워커마다 PDF를 한 번 열어 담당 페이지 구간만 추출
+    with open(file_path, 'rb') as file:
+        pdf_reader = PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
 
 class DocumentProcessor:
-    def __init__(self, chunk_size=1000, chunk_overlap=200):
+    def __init__(self, chunk_size=1000, chunk_overlap=200, pdf_workers=None, pages_per_task=8, chunker=None,
+                 page_cache: PageTextCache = None):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.pdf_workers = pdf_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+        # CHUNKER=sentence(기본): 문장 경계 + 토큰 수 기준, recursive: 기존 글자 수 기준 LangChain 분할
+        self.chunker = chunker or os.getenv('CHUNKER', 'sentence')
+        if self.chunker not in ('sentence', 'recursive'):
+            raise ValueError(f"Unsupported chunker: {self.chunker}")
+        self.sentence_chunker = SentenceChunker(
+            chunk_tokens=int(os.getenv('CHUNK_TOKENS', 500)),
+            overlap_tokens=int(os.getenv('CHUNK_OVERLAP_TOKENS', 100)),
+        )
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
         )
-    
-    def process_document(self, file_path):
-        text = self._extract_text(file_path)
-        chunks = self.text_splitter.split_text(text)
+        self.page_cache = page_cache or PageTextCache(os.getenv('PAGE_TEXT_CACHE_DIR', 'cache/page_text'))
+
+    def process_document(self, file_path, progress_callback=None, content_hash=None):
+        chunks, _ = self.process_document_with_metadata(file_path, progress_callback, content_hash)
         return chunks
-    
-    def _extract_text(self, file_path):
+
+    def process_document_with_metadata(self, file_path, progress_callback=None,
+                                       content_hash=None) -> Tuple[List[str], List[dict]]:
+        """청크 목록과 청크별 메타데이터(페이지 번호, sentence 청커는 문자 오프셋 포함)를 함께 반환.
+        content_hash는 업로드 시 계산해 둔 파일 sha256 (없으면 PDF일 때 파일을 읽어 계산)"""
+        chunks, metadatas = [], []
+        file_type = os.path.splitext(file_path)[1].lower().lstrip('.')
+        pages = self._iter_pages(file_path, progress_callback, content_hash)
+        with metrics.span("document_process", file_type=file_type):
+            if self.chunker == 'sentence':
+                for chunk in self.sentence_chunker.chunk_pages(pages):
+                    chunks.append(chunk.text)
+                    metadatas.append(chunk.metadata())
+            else:
+                for chunk, page in self._split_pages(pages):
+                    chunks.append(chunk)
+                    metadatas.append({"page": page})
+        metrics.items.inc(len(chunks), stage="document_process", kind="chunks")
+        return chunks, metadatas
+
+    def _iter_pages(self, file_path, progress_callback=None, content_hash=None) -> Iterator[Tuple[int, str]]:
         file_extension = os.path.splitext(file_path)[1].lower()
-        
+
         if file_extension == '.pdf':
-            return self._extract_pdf_text(file_path)
+            yield from self._iter_cached_pdf_pages(file_path, progress_callback, content_hash)
         elif file_extension == '.txt':
-            return self._extract_txt_text(file_path)
+            yield 1, self._extract_txt_text(file_path)
         else:
             raise ValueError(f"Unsupported file type: {file_extension}")
-    
-    def _extract_pdf_text(self, file_path):
-        text = ""
+
+    def _split_pages(self, pages: Iterator[Tuple[int, str]]) -> Iterator[Tuple[str, int]]:
+        """페이지 텍스트를 순서대로 받아 (청크, 시작 페이지)를 생성.
+        버퍼는 청크 몇 개 분량만 유지하고, 마지막 청크는 다음 페이지와 이어 붙이기 위해 남겨둠"""
+        buffer = ""
+        boundaries = []  # (버퍼 내 시작 위치, 페이지 번호)
+        flush_size = self.chunk_size * 4
+
+        def page_at(offset):
+            page = boundaries[0][1]
+            for start, number in boundaries:
+                if start > offset:
+                    break
+                page = number
+            return page
+
+        def locate(chunks):
+            offsets, cursor = [], 0
+            for chunk in chunks:
+                position = buffer.find(chunk, cursor)
+                if position < 0:
+                    position = cursor
+                offsets.append(position)
+                cursor = position + 1
+            return offsets
+
+        for page_number, page_text in pages:
+            if not page_text:
+                continue
+            if buffer:
+                buffer += "\n"
+            boundaries.append((len(buffer), page_number))
+            buffer += page_text
+            if len(buffer) < flush_size:
+                continue
+
+            chunks = self.text_splitter.split_text(buffer)
+            offsets = locate(chunks)
+            for chunk, offset in zip(chunks[:-1], offsets[:-1]):
+                yield chunk, page_at(offset)
+
+            # 마지막 청크부터 버퍼를 다시 시작
+            carry_from = offsets[-1]
+            carry_page = page_at(carry_from)
+            boundaries = [(max(start - carry_from, 0), number) for start, number in boundaries
+                          if start > carry_from or number == carry_page]
+            buffer = buffer[carry_from:]
+
+        if buffer.strip():
+            chunks = self.text_splitter.split_text(buffer)
+            for chunk, offset in zip(chunks, locate(chunks)):
+                yield chunk, page_at(offset)
+
+    def _iter_cached_pdf_pages(self, file_path, progress_callback=None, content_hash=None) -> Iterator[Tuple[int, str]]:
+        """캐시에 같은 내용의 PDF 추출 결과가 있으면 파싱 없이 한 페이지씩 내보내고,
+        없으면 추출하면서 페이지를 캐시 파일에 이어 쓰고 끝까지 성공한 경우에만 확정"""
+        content_hash = content_hash or hash_file(file_path)
+        cached = self.page_cache.iter_pages(content_hash, EXTRACTOR_VERSION)
+        if cached is not None:
+            last_page = 0
+            try:
+                for page in cached:
+                    last_page = page[0]
+                    yield page
+            except PageCacheCorrupt:
+                # 이미 내보낸 페이지는 건너뛰고 나머지만 PDF에서 추출
+                for page in self._iter_pdf_pages(file_path, progress_callback):
+                    if page[0] > last_page:
+                        yield page
+                return
+            if progress_callback:
+                progress_callback(last_page, last_page)
+            return
+
+        writer = self.page_cache.writer(content_hash, EXTRACTOR_VERSION)
+        try:
+            for page in self._iter_pdf_pages(file_path, progress_callback):
+                writer.write(*page)
+                yield page
+            writer.commit()
+        finally:
+            writer.close()
+
+    def _iter_pdf_pages(self, file_path, progress_callback=None) -> Iterator[Tuple[int, str]]:
         try:
             with open(file_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                total_pages = len(pdf_reader.pages)
-                print(f"Processing PDF with {total_pages} pages")
-                
-                if total_pages > 50:
-                    raise Exception(f"PDF too large: {total_pages} pages (max 50)")
-                
-                for i, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text
-                    print(f"Processed page {i+1}/{total_pages}")
-                    
+                total_pages = len(PdfReader(file).pages)
+        except Exception as e:
+            raise Exception(f"Error reading PDF file: {str(e)}")
+
+        logger.info(f"Processing PDF with {total_pages} pages")
+        ranges = [(start, min(start + self.pages_per_task, total_pages))
+                  for start in range(0, total_pages, self.pages_per_task)]
+
+        has_text = False
+        pages_done = 0
+        executor = None
+        try:
+            if self.pdf_workers > 1 and len(ranges) > 1:
+                executor = ProcessPoolExecutor(max_workers=min(self.pdf_workers, len(ranges)))
+                results = executor.map(_extract_page_range,
+                                       [file_path] * len(ranges),
+                                       [start for start, _ in ranges],
+                                       [end for _, end in ranges])
+            else:
+                results = (_extract_page_range(file_path, start, end) for start, end in ranges)
+
+            # 구간별 결과를 순서대로 받아 바로 다음 단계(청킹)로 전달
+            for (start, _), page_texts in zip(ranges, results):
+                for offset, page_text in enumerate(page_texts):
+                    if page_text.strip():
+                        has_text = True
+                    yield start + offset + 1, page_text
+                pages_done += len(page_texts)
+                if progress_callback:
+                    progress_callback(pages_done, total_pages)
         except Exception as e:
             raise Exception(f"Error reading PDF file: {str(e)}")
-        
-        if not text.strip():
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        if not has_text:
             raise Exception("PDF contains no readable text")
-        
-        return text
-    
+
     def _extract_txt_text(self, file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
@@ -61,4 +209,4 @@ class DocumentProcessor:
                 text = file.read()
         except Exception as e:
             raise Exception(f"Error reading TXT file: {str(e)}")
-        return text
\ No newline at end of file
+        return text
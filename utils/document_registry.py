@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_TENANT = "default"
+
+class DocumentRegistry:
+    """문서(source)별 소속 테넌트, 청크 ID, 크기, 수집 시각을 보관하는 사이드카 인덱스"""
+
+    def __init__(self, persist_directory="data"):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.db_path = os.path.join(persist_directory, "document_registry.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                source TEXT PRIMARY KEY,
+                chunk_ids TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                total_chars INTEGER NOT NULL,
+                ingested_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS registry_meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(documents)")}
+        if "tenant" not in columns:
+            self._conn.execute(f"ALTER TABLE documents ADD COLUMN tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'")
+        if "content_hash" not in columns:
+            # 원본 파일 sha256 (색인이 끝난 문서에만 기록, 같은 내용의 재업로드 판별용)
+            self._conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash, tenant)")
+        self._conn.commit()
+
+    def is_built(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM registry_meta WHERE key = 'built'").fetchone()
+        return row is not None
+
+    def rebuild(self, ids: List[str], metadatas: List[dict], documents: List[str], tenant: str = DEFAULT_TENANT):
+        """기존 컬렉션 전체를 한 번 스캔해 레지스트리를 채움 (최초 1회)"""
+        now = time.time()
+        grouped = {}
+        for chunk_id, metadata, document in zip(ids, metadatas, documents):
+            source = metadata.get('source')
+            if source is None:
+                continue
+            entry = grouped.setdefault(source, {"ids": [], "chars": 0})
+            entry["ids"].append(chunk_id)
+            entry["chars"] += len(document or "")
+
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.executemany(
+                "INSERT INTO documents (source, chunk_ids, chunk_count, total_chars, ingested_at, updated_at, tenant) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(source, json.dumps(entry["ids"]), len(entry["ids"]), entry["chars"], now, now, tenant)
+                 for source, entry in grouped.items()]
+            )
+            self._conn.execute("INSERT OR REPLACE INTO registry_meta VALUES ('built', '1')")
+            self._conn.commit()
+
+    def add_chunks(self, source: str, chunk_ids: List[str], chunks: List[str], tenant: str = DEFAULT_TENANT):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE source = ?", (source,)).fetchone()
+            if row is None:
+                ids = list(chunk_ids)
+                total_chars = sum(len(chunk) for chunk in chunks)
+                ingested_at = now
+            else:
+                existing = json.loads(row["chunk_ids"])
+                known = set(existing)
+                ids = existing + [chunk_id for chunk_id in chunk_ids if chunk_id not in known]
+                total_chars = row["total_chars"] + sum(
+                    len(chunk) for chunk_id, chunk in zip(chunk_ids, chunks) if chunk_id not in known
+                )
+                ingested_at = row["ingested_at"]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (source, chunk_ids, chunk_count, total_chars, ingested_at, "
+                "updated_at, tenant) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, json.dumps(ids), len(ids), total_chars, ingested_at, now, tenant)
+            )
+            self._conn.commit()
+
+    def replace_chunks(self, source: str, chunk_ids: List[str], total_chars: int, tenant: str = DEFAULT_TENANT):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT ingested_at FROM documents WHERE source = ?", (source,)).fetchone()
+            ingested_at = row["ingested_at"] if row else now
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (source, chunk_ids, chunk_count, total_chars, ingested_at, "
+                "updated_at, tenant) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, json.dumps(chunk_ids), len(chunk_ids), total_chars, ingested_at, now, tenant)
+            )
+            self._conn.commit()
+
+    def set_content_hash(self, source: str, content_hash: str):
+        with self._lock:
+            self._conn.execute("UPDATE documents SET content_hash = ? WHERE source = ?", (content_hash, source))
+            self._conn.commit()
+
+    def find_by_hash(self, content_hash: str, tenant: str = DEFAULT_TENANT) -> Optional[str]:
+        """같은 테넌트에 내용이 같은 파일로 색인된 문서가 있으면 그 source"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source FROM documents WHERE content_hash = ? AND tenant = ? ORDER BY ingested_at LIMIT 1",
+                (content_hash, tenant)
+            ).fetchone()
+        return row["source"] if row else None
+
+    def remove(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def get(self, source: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["chunk_ids"] = json.loads(entry["chunk_ids"])
+        return entry
+
+    def list_sources(self, tenants: List[str] = None) -> List[str]:
+        return [entry["source"] for entry in self.list_documents(tenants)]
+
+    def list_documents(self, tenants: List[str] = None) -> List[Dict]:
+        query = "SELECT source, tenant, chunk_count, total_chars, ingested_at, updated_at FROM documents"
+        params = []
+        if tenants:
+            query += f" WHERE tenant IN ({','.join('?' * len(tenants))})"
+            params = list(tenants)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY ingested_at", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_tenants(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT tenant FROM documents ORDER BY tenant").fetchall()
+        return [row["tenant"] for row in rows]
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+
+from utils.metrics import metrics
+
+class EmbeddingCache:
+    """(모델명, 정규화된 텍스트 해시) 기반 임베딩 디스크 캐시 (LRU 방식 용량 제한)"""
+
+    def __init__(self, cache_directory="cache", max_entries=100000):
+        self.cache_directory = cache_directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_directory, exist_ok=True)
+        self.db_path = os.path.join(cache_directory, "embeddings.sqlite3")
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # 유니코드 정규화 + 공백 정리 (같은 문장의 사소한 차이로 캐시 미스가 나지 않도록)
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, model: str, text: str) -> str:
+        digest = hashlib.sha256(cls.normalize(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """캐시에 있는 항목만 {입력 인덱스: 임베딩} 형태로 반환"""
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            unique_keys = list(set(keys))
+            rows = {}
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", part
+                ):
+                    rows[key] = blob
+
+            if rows:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in rows]
+                )
+                self._conn.commit()
+
+            for i, key in enumerate(keys):
+                blob = rows.get(key)
+                if blob is not None:
+                    found[i] = array("f", blob).tolist()
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        metrics.cache_events.inc(len(found), cache="embedding", result="hit")
+        metrics.cache_events.inc(len(texts) - len(found), cache="embedding", result="miss")
+        return found
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text]).get(0)
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        now = time.time()
+        rows = [
+            (self.make_key(model, text), sqlite3.Binary(array("f", embedding).tobytes()), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding, last_access) VALUES (?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            # 가장 오래 사용되지 않은 항목부터 제거
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
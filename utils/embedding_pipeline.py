@@ -0,0 +1,117 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import openai
+from utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """분당 요청 수(RPM)와 분당 토큰 수(TPM)를 함께 제한하는 토큰 버킷"""
+
+    def __init__(self, requests_per_minute=3000, tokens_per_minute=1000000):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_allowance = min(
+            self.requests_per_minute,
+            self._request_allowance + elapsed * self.requests_per_minute / 60.0
+        )
+        self._token_allowance = min(
+            self.tokens_per_minute,
+            self._token_allowance + elapsed * self.tokens_per_minute / 60.0
+        )
+
+    def acquire(self, tokens: int):
+        # 한 배치가 분당 한도보다 크면 한도만큼만 기다림
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return
+                request_wait = (1 - self._request_allowance) * 60.0 / self.requests_per_minute
+                token_wait = (tokens - self._token_allowance) * 60.0 / self.tokens_per_minute
+                wait = max(request_wait, token_wait, 0.01)
+            time.sleep(wait)
+
+class EmbeddingPipeline:
+    """토큰 예산 기준으로 배치를 묶고, 여러 임베딩 요청을 동시에 처리"""
+
+    RETRYABLE_ERRORS = (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]],
+                 model="text-embedding-ada-002", max_batch_tokens=8000, max_batch_size=512,
+                 max_workers=4, rate_limiter: RateLimiter = None, max_retries=5):
+        self.embed_fn = embed_fn
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter  # None이면 제한 없음 (로컬 모델)
+        self.max_retries = max_retries
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """텍스트 인덱스를 토큰 예산 이내의 배치로 묶음"""
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if current and (current_tokens + tokens > self.max_batch_tokens
+                            or len(current) >= self.max_batch_size):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def _embed_with_retry(self, batch_texts: List[str], batch_tokens: int) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire(batch_tokens)
+            try:
+                return self.embed_fn(batch_texts)
+            except self.RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                # 지수 백오프 + 지터
+                delay = min(2 ** attempt, 30) + random.uniform(0, 1)
+                logger.warning(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        batches = self.pack_batches(texts)
+        logger.info(f"Embedding {len(texts)} chunks in {len(batches)} batches "
+                    f"({self.max_workers} concurrent requests)")
+
+        results = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                (indices, executor.submit(self._embed_with_retry, [texts[i] for i in indices], tokens))
+                for indices, tokens in batches
+            ]
+            for indices, future in futures:
+                for i, embedding in zip(indices, future.result()):
+                    results[i] = embedding
+        return results
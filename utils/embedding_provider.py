@@ -0,0 +1,79 @@
+import asyncio
+import os
+from typing import List
+
+import openai
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # sentence-transformers 미설치 시 OpenAI 백엔드만 사용 가능
+    SentenceTransformer = None
+
+class EmbeddingProvider:
+    """임베딩 백엔드 인터페이스. name은 캐시 키와 컬렉션 메타데이터에 기록되는 모델 식별자"""
+
+    name = None
+    # 원격 API는 요청 수/토큰 수 제한과 동시 요청이 필요하고, 로컬 모델은 한 번에 큰 배치로 처리
+    remote = True
+    max_workers = 4
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed, texts)
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model="text-embedding-ada-002"):
+        self.name = model
+        self.max_workers = int(os.getenv('EMBEDDING_WORKERS', 4))
+        openai.api_key = os.getenv('OPENAI_API_KEY')
+        self._async_client = None
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = openai.embeddings.create(input=texts, model=self.name)
+        return [item.embedding for item in response.data]
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=openai.api_key)
+        response = await self._async_client.embeddings.create(input=texts, model=self.name)
+        return [item.embedding for item in response.data]
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers 모델을 CPU에서 실행 (runtime='onnx'면 ONNX Runtime 백엔드 사용)"""
+
+    remote = False
+    max_workers = 1  # 배치 내부 연산이 이미 torch/ONNX 스레드로 모든 코어를 사용
+
+    def __init__(self, model="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 batch_size=64, runtime="torch", num_threads=None):
+        if SentenceTransformer is None:
+            raise ImportError("sentence-transformers is required for the local embedding backend")
+        self.name = model
+        self.batch_size = batch_size
+        if runtime == "onnx":
+            self.model = SentenceTransformer(model, device="cpu", backend="onnx")
+        else:
+            import torch
+            torch.set_num_threads(num_threads or os.cpu_count() or 1)
+            self.model = SentenceTransformer(model, device="cpu")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                       convert_to_numpy=True, show_progress_bar=False)
+        return embeddings.tolist()
+
+def create_embedding_provider(backend: str = None, model: str = None) -> EmbeddingProvider:
+    """EMBEDDING_PROVIDER 환경변수('openai' 또는 'local')와 EMBEDDING_MODEL로 백엔드 선택"""
+    backend = backend or os.getenv('EMBEDDING_PROVIDER', 'openai')
+    model = model or os.getenv('EMBEDDING_MODEL')
+    if backend == 'openai':
+        return OpenAIEmbeddingProvider(model or "text-embedding-ada-002")
+    if backend == 'local':
+        return LocalEmbeddingProvider(
+            model or "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+            batch_size=int(os.getenv('LOCAL_EMBEDDING_BATCH_SIZE', 64)),
+            runtime=os.getenv('LOCAL_EMBEDDING_RUNTIME', 'torch')
+        )
+    raise ValueError(f"Unsupported embedding provider: {backend}")
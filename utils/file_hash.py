@@ -0,0 +1,32 @@
+import hashlib
+import os
+import tempfile
+from typing import Tuple
+
+_READ_BYTES = 1024 * 1024
+
+def hash_file(file_path: str) -> str:
+    """파일 내용의 sha256 (메모리에 전체를 올리지 않고 블록 단위로 읽음)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(_READ_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_stream(stream, file_path: str) -> Tuple[str, str]:
+    """업로드 스트림을 file_path와 같은 디렉터리의 임시 파일에 쓰면서 sha256을 계산해 (임시 경로, 해시) 반환.
+    중복 확인이나 색인이 끝난 뒤 호출한 쪽에서 os.replace로 제자리에 옮기거나 지움.
+    확장자로 파일 형식을 판단하므로 임시 파일도 같은 확장자를 씀"""
+    directory = os.path.dirname(file_path) or "."
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=os.path.splitext(file_path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            for block in iter(lambda: stream.read(_READ_BYTES), b""):
+                digest.update(block)
+                file.write(block)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()
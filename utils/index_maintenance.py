@@ -0,0 +1,162 @@
+import json
+import os
+import time
+from typing import Dict, List
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from utils.collection_swap import REBUILD_SUFFIX, recover_collection, swap_collection
+from utils.embedding_provider import EmbeddingProvider
+from utils.numpy_index import NumpyClient
+from utils.retrieval import cosine_similarities
+from utils.vector_store import HNSW_PROFILES, create_embedding_pipeline
+
+def _client(persist_directory: str):
+    # 재임베딩/재구성은 VectorStore와 같은 VECTOR_BACKEND의 컬렉션을 대상으로 함
+    if os.getenv('VECTOR_BACKEND', 'chroma') == 'numpy':
+        return NumpyClient(os.path.join(persist_directory, "numpy"), dtype=os.getenv('NUMPY_VECTOR_DTYPE', 'int8'))
+    return chromadb.PersistentClient(path=persist_directory, settings=Settings(anonymized_telemetry=False))
+
+def _index_size(persist_directory: str) -> int:
+    # HNSW 세그먼트 폴더(data/<uuid>/)만 합산. chroma.sqlite3는 VACUUM 전까지 줄어들지 않음
+    total = 0
+    for entry in os.scandir(persist_directory):
+        if entry.is_dir():
+            for root, _, files in os.walk(entry.path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def _iter_pages(collection, include: List[str], page_size: int):
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        yield collection.get(include=include, limit=page_size, offset=offset)
+
+def list_collection_names(persist_directory="data") -> List[str]:
+    return [collection.name for collection in _client(persist_directory).list_collections()]
+
+def _rewrite_collection(client, collection_name: str, metadata: Dict, provider: EmbeddingProvider = None,
+                        page_size=1000) -> int:
+    """임시 컬렉션에 같은 id/본문/메타데이터를 기록한 뒤 기존 컬렉션과 교체.
+    provider가 없으면 저장된 임베딩을 그대로 복사 (임베딩 API 호출 없음)"""
+    recover_collection(client, collection_name)
+    source = client.get_collection(collection_name)
+    target_name = collection_name + REBUILD_SUFFIX
+    try:
+        client.delete_collection(target_name)  # 이전에 중단된 작업의 잔여물
+    except ValueError:
+        pass
+    target = client.create_collection(name=target_name, metadata=metadata)
+
+    pipeline = create_embedding_pipeline(provider) if provider else None
+    include = ["documents", "metadatas"] + ([] if provider else ["embeddings"])
+    total, written = source.count(), 0
+    for page in _iter_pages(source, include, page_size):
+        embeddings = pipeline.embed(page['documents']) if pipeline else page['embeddings']
+        target.add(ids=page['ids'], documents=page['documents'], embeddings=embeddings,
+                   metadatas=page['metadatas'])
+        written += len(page['ids'])
+        print(f"  {written}/{total}")
+
+    swap_collection(client, collection_name, target)
+    return written
+
+def rebuild_collection(collection_name="documents", persist_directory="data", profile: str = None,
+                       page_size=1000) -> Dict:
+    """저장된 임베딩으로 HNSW 색인을 새로 구성. 삭제로 생긴 빈 슬롯이 정리되고 profile이 적용됨
+    (문서 레지스트리와 키워드 색인은 청크 id가 그대로라 영향 없음)"""
+    client = _client(persist_directory)
+    metadata = dict(client.get_collection(collection_name).metadata or {})
+    metadata.setdefault("hnsw:space", "cosine")
+    profile = profile or os.getenv('HNSW_PROFILE', 'balanced')
+    if profile not in HNSW_PROFILES:
+        raise ValueError(f"Unknown HNSW profile: {profile}")
+    metadata.update(HNSW_PROFILES[profile])
+    metadata["hnsw_profile"] = profile
+
+    size_before = _index_size(persist_directory)
+    started_at = time.time()
+    print(f"Rebuilding '{collection_name}' with HNSW profile '{profile}'")
+    chunks = _rewrite_collection(client, collection_name, metadata, page_size=page_size)
+    result = {
+        "collection": collection_name,
+        "profile": profile,
+        "chunks": chunks,
+        "seconds": round(time.time() - started_at, 2),
+        "index_bytes_before": size_before,
+        "index_bytes_after": _index_size(persist_directory),
+    }
+    print(f"Rebuilt '{collection_name}': {result}")
+    return result
+
+def reembed_collection(provider: EmbeddingProvider, collection_name="documents", persist_directory="data",
+                       page_size=1000) -> int:
+    """컬렉션 전체를 새 임베딩 모델로 다시 임베딩 (HNSW 설정은 유지)"""
+    client = _client(persist_directory)
+    metadata = dict(client.get_collection(collection_name).metadata or {})
+    metadata.setdefault("hnsw:space", "cosine")
+    metadata["embedding_model"] = provider.name
+
+    print(f"Re-embedding '{collection_name}' with {provider.name}")
+    total = _rewrite_collection(client, collection_name, metadata, provider, page_size)
+    print(f"Collection '{collection_name}' now uses {provider.name}")
+    return total
+
+def profile_report(collection_name="documents", persist_directory="data", profiles: List[str] = None,
+                   num_queries=200, k=10, noise=0.05, seed=0) -> Dict:
+    """저장된 임베딩으로 프로파일별 임시 색인을 만들어 recall@k와 검색 지연을 비교.
+    질의는 무작위 청크 임베딩에 작은 잡음을 더해 만들고, 정답은 전체 벡터에 대한 정확한 코사인 top-k"""
+    client = _client(persist_directory)
+    source = client.get_collection(collection_name)
+    ids, embeddings = [], []
+    for page in _iter_pages(source, ["embeddings"], 1000):
+        ids.extend(page['ids'])
+        embeddings.extend(page['embeddings'])
+    if not ids:
+        raise ValueError(f"Collection '{collection_name}' is empty")
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    k = min(k, len(ids))
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(ids), size=min(num_queries, len(ids)), replace=False)
+    queries = matrix[picks] + rng.normal(0, noise, size=(len(picks), matrix.shape[1])).astype(np.float32)
+    exact = [set(np.argsort(-cosine_similarities(query, matrix))[:k]) for query in queries]
+
+    report = {"collection": collection_name, "chunks": len(ids), "queries": len(picks), "k": k, "profiles": {}}
+    for profile in profiles or list(HNSW_PROFILES):
+        bench_name = f"hnsw-bench-{profile}"
+        try:
+            client.delete_collection(bench_name)
+        except ValueError:
+            pass
+        started_at = time.time()
+        bench = client.create_collection(name=bench_name, metadata={"hnsw:space": "cosine", **HNSW_PROFILES[profile]})
+        for start in range(0, len(ids), client.max_batch_size):
+            bench.add(ids=[str(i) for i in range(start, min(start + client.max_batch_size, len(ids)))],
+                      embeddings=matrix[start:start + client.max_batch_size].tolist())
+        build_seconds = time.time() - started_at
+
+        latencies, recalls = [], []
+        try:
+            for query, truth in zip(queries, exact):
+                started_at = time.perf_counter()
+                result = bench.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+                latencies.append((time.perf_counter() - started_at) * 1000)
+                recalls.append(len(truth & {int(i) for i in result['ids'][0]}) / k)
+        finally:
+            client.delete_collection(bench_name)
+
+        report["profiles"][profile] = {
+            f"recall@{k}": round(float(np.mean(recalls)), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "build_seconds": round(build_seconds, 2),
+        }
+        print(f"{profile:>9}: {report['profiles'][profile]}")
+    return report
+
+def save_report(report: Dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
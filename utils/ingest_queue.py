@@ -0,0 +1,314 @@
+import os
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from utils.document_processor import DocumentProcessor
+from utils.file_hash import hash_file
+from utils.metrics import metrics
+from utils.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# 문서 하나당 청크 수 상한 (모든 진입점 공통, 0이면 제한 없음). 기본값은 수백 쪽짜리 안내서도 받아들이는 수준
+MAX_DOCUMENT_CHUNKS = int(os.getenv('MAX_DOCUMENT_CHUNKS', 5000))
+
+class JobCancelled(Exception):
+    pass
+
+class IngestQueue:
+    """SQLite에 작업 상태를 기록하는 문서 수집(추출→청킹→임베딩→저장) 백그라운드 작업 큐"""
+
+    def __init__(self, doc_processor: DocumentProcessor, vector_store: VectorStore,
+                 db_path="cache/ingest_jobs.sqlite3", num_workers=2, max_chunks=None,
+                 commit_size=256, lease_seconds=None):
+        self.doc_processor = doc_processor
+        self.vector_store = vector_store
+        self.db_path = db_path
+        self.num_workers = num_workers
+        self.max_chunks = MAX_DOCUMENT_CHUNKS if max_chunks is None else max_chunks
+        self.commit_size = commit_size
+        # 실행 중인 작업은 이 워커 ID와 임대 만료 시각으로 소유를 표시하고, 하트비트 스레드가 주기적으로 연장
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds or float(os.getenv('INGEST_LEASE_SECONDS', 60))
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                document_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages_total INTEGER DEFAULT 0,
+                pages_extracted INTEGER DEFAULT 0,
+                chunks_total INTEGER DEFAULT 0,
+                chunks_embedded INTEGER DEFAULT 0,
+                chunks_written INTEGER DEFAULT 0,
+                chunks_reused INTEGER DEFAULT 0,
+                tenant TEXT,
+                content_hash TEXT,
+                duplicate_of TEXT,
+                target_path TEXT,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                cancel_requested INTEGER DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        # 이전 버전에서 만들어진 DB에 새 컬럼 추가
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "chunks_reused" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN chunks_reused INTEGER DEFAULT 0")
+        if "tenant" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT")
+        if "content_hash" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+        if "duplicate_of" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN duplicate_of TEXT")
+        if "target_path" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN target_path TEXT")
+        if "worker_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT")
+        if "lease_expires_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        self._conn.commit()
+
+    def start(self):
+        if self._workers:
+            return
+        self._requeue_expired()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        threading.Thread(target=self._heartbeat_loop, name="ingest-heartbeat", daemon=True).start()
+        self._wakeup.set()
+
+    def enqueue(self, file_path: str, document_name: str, tenant: str = None, content_hash: str = None,
+                target_path: str = None) -> str:
+        """tenant를 지정하면 해당 테넌트(부서) 컬렉션에 색인.
+        content_hash(업로드 시 계산한 sha256)가 같은 파일이 같은 테넌트에서 이미 처리 중이면 그 작업 ID를 반환.
+        target_path를 주면 file_path는 임시 업로드 파일로 보고, 색인이 끝난 뒤에만 target_path로 옮김
+        (중복이거나 취소/실패하면 지움)"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            if content_hash:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE content_hash = ? AND tenant IS ? AND status IN ('queued', 'running') "
+                    "ORDER BY created_at LIMIT 1",
+                    (content_hash, tenant)
+                ).fetchone()
+                if row is not None:
+                    metrics.items.inc(stage="upload", kind="duplicates")
+                    self._release_file({"file_path": file_path, "target_path": target_path}, keep=False)
+                    return row["id"]
+            self._conn.execute(
+                "INSERT INTO jobs (id, file_path, document_name, tenant, content_hash, target_path, status, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, file_path, document_name, tenant, content_hash, target_path, now, now)
+            )
+            self._conn.commit()
+        self._wakeup.set()
+        return job_id
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, active_only=False) -> List[Dict]:
+        query = "SELECT * FROM jobs"
+        if active_only:
+            query += " WHERE status IN ('queued', 'running')"
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created_at DESC").fetchall()
+        return [dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+            dequeued = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled' WHERE id = ? AND status = 'queued'", (job_id,)
+            ).rowcount
+            self._conn.commit()
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone() if dequeued else None
+        if job is not None:
+            # 시작 전에 취소된 작업은 워커가 처리하지 않으므로 여기서 임시 업로드 파일을 정리
+            self._release_file(job, keep=False)
+        return cursor.rowcount > 0
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _requeue_expired(self):
+        """임대가 만료된 'running' 작업(소유 프로세스가 비정상 종료됨)만 대기열로 되돌려 마지막으로 기록된 배치부터 재개.
+        같은 DB를 쓰는 다른 프로세스(여러 gunicorn 워커, 리로더, Streamlit)가 실행 중인 작업은 건드리지 않음"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires_at = NULL "
+                "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (time.time(),)
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} ingest job(s) with expired leases")
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET lease_expires_at = ? WHERE worker_id = ? AND status = 'running'",
+                        (time.time() + self.lease_seconds, self.worker_id)
+                    )
+                    self._conn.commit()
+                self._requeue_expired()
+            except Exception:
+                logger.exception("Ingest heartbeat failed")
+
+    def _claim_next(self) -> Optional[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 5"
+            ).fetchall()
+            for row in rows:
+                # 다른 프로세스의 워커와 경쟁하더라도 하나만 가져가도록 조건부 갱신
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires_at = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (self.worker_id, time.time() + self.lease_seconds, time.time(), row["id"])
+                )
+                self._conn.commit()
+                if cursor.rowcount:
+                    return dict(row)
+        return None
+
+    def _check_cancelled(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and row["cancel_requested"]:
+            raise JobCancelled()
+
+    def _worker_loop(self):
+        while True:
+            job = self._claim_next()
+            if job is None:
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+            self._run_job(job)
+
+    @staticmethod
+    def _source_path(job: Dict) -> str:
+        # 완료 직전에 중단돼 임시 업로드 파일이 이미 제자리로 옮겨진 작업은 옮긴 파일로 재개
+        if job["target_path"] and not os.path.exists(job["file_path"]) and os.path.exists(job["target_path"]):
+            return job["target_path"]
+        return job["file_path"]
+
+    @staticmethod
+    def _release_file(job: Dict, keep: bool):
+        """임시 업로드 파일을 색인이 끝났으면 target_path로 옮기고, 아니면 지움.
+        중복 파일이 같은 이름의 기존 문서 원본을 덮어쓰거나 색인되지 않은 채 남지 않도록 함"""
+        staged, target = job["file_path"], job["target_path"]
+        if not target or staged == target or not os.path.exists(staged):
+            return
+        try:
+            if keep:
+                os.replace(staged, target)
+            else:
+                os.remove(staged)
+        except OSError:
+            logger.warning("Could not release uploaded file", exc_info=True, extra={"path": staged})
+
+    def _run_job(self, job: Dict):
+        job_id = job["id"]
+        existed = False
+        try:
+            # 이미 색인된 문서의 재업로드인지 (취소 시 기존 버전을 지우지 않기 위해 작업 시작 전에 기록)
+            existed = job["chunks_written"] == 0 and self.vector_store.has_document(job["document_name"])
+            # 대기 중에 같은 이름으로 다른 파일이 덮어썼을 수 있으므로 실제로 처리할 파일 기준으로 다시 계산
+            file_path = self._source_path(job)
+            content_hash = hash_file(file_path)
+            duplicate = self.vector_store.find_duplicate(content_hash, job["tenant"])
+            if duplicate is not None and job["chunks_written"] == 0:
+                # 같은 내용이 이미 색인돼 있으면 추출/임베딩 없이 기존 항목을 가리키고 종료
+                metrics.items.inc(stage="upload", kind="duplicates")
+                self._release_file(job, keep=False)
+                self._update(job_id, status="completed", duplicate_of=duplicate, content_hash=content_hash)
+                return
+
+            def on_page(done, total):
+                self._update(job_id, pages_extracted=done, pages_total=total)
+
+            chunks, chunk_metadatas = self.doc_processor.process_document_with_metadata(
+                file_path, progress_callback=on_page, content_hash=content_hash
+            )
+            self._check_cancelled(job_id)
+
+            if self.max_chunks and len(chunks) > self.max_chunks:
+                raise ValueError(f"File too large: {len(chunks)} chunks (max {self.max_chunks})")
+
+            pages_total = max(self.get_status(job_id)["pages_total"], 1)
+            self._update(job_id, pages_total=pages_total, pages_extracted=pages_total, chunks_total=len(chunks))
+
+            # 이미 색인된 문서를 다시 올린 경우 바뀐 청크만 반영
+            if existed:
+                summary = self.vector_store.update_document(chunks, job["document_name"], chunk_metadatas,
+                                                            tenant=job["tenant"])
+                self.vector_store.set_content_hash(job["document_name"], content_hash)
+                self._release_file(job, keep=True)
+                self._update(job_id, status="completed", chunks_reused=summary["reused"],
+                             chunks_embedded=summary["embedded"], chunks_written=len(chunks))
+                return
+
+            def on_progress(stage, count):
+                if stage == "embedded":
+                    self._update(job_id, chunks_embedded=count)
+                else:
+                    self._update(job_id, chunks_written=count)
+                self._check_cancelled(job_id)
+
+            # 이미 커밋된 배치 이후부터 이어서 처리
+            self.vector_store.add_documents(
+                chunks, job["document_name"],
+                start_index=job["chunks_written"],
+                commit_size=self.commit_size,
+                progress_callback=on_progress,
+                chunk_metadatas=chunk_metadatas,
+                tenant=job["tenant"]
+            )
+            self.vector_store.set_content_hash(job["document_name"], content_hash)
+            self._release_file(job, keep=True)
+            self._update(job_id, status="completed")
+        except JobCancelled:
+            # 새 문서라면 일부만 기록된 청크를 제거해 인덱스를 일관되게 유지.
+            # 재업로드는 update_document 전에만 취소 확인을 하므로 이 작업이 쓴 청크가 없고, 기존 버전을 그대로 둠
+            if not existed:
+                self.vector_store.delete_document(job["document_name"])
+            self._release_file(job, keep=False)
+            self._update(job_id, status="cancelled")
+        except Exception as e:
+            logger.exception("Ingest job failed", extra={"job_id": job_id, "document": job["document_name"]})
+            self._release_file(job, keep=False)
+            self._update(job_id, status="failed", error=str(e))
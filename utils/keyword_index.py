@@ -0,0 +1,133 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Tuple
+
+from utils.document_registry import DEFAULT_TENANT
+from utils.metrics import metrics
+
+_NUMBER_SEPARATOR = re.compile(r'(?<=\d),(?=\d{3})')
+_RUN = re.compile(r'[0-9a-z]+|[가-힣]+')
+_NUMBER_UNIT = re.compile(r'\d+[가-힣]')
+
+def tokenize(text: str) -> List[str]:
+    """한국어용 토크나이저: 한글 구간은 글자 2-gram, 영문/숫자 구간은 단어 단위.
+    '제3조', '200만원'처럼 숫자+단위 조합은 별도 토큰으로 추가"""
+    text = _NUMBER_SEPARATOR.sub('', text.lower())
+    tokens = []
+    for run in _RUN.findall(text):
+        if len(run) == 1 or not '가' <= run[0] <= '힣':
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i+2] for i in range(len(run) - 1))
+    tokens.extend(_NUMBER_UNIT.findall(text))
+    return tokens
+
+class KeywordIndex:
+    """청크 단위 역색인 + BM25 점수 (Chroma 컬렉션과 함께 증분 갱신)"""
+
+    def __init__(self, persist_directory="data", k1=1.2, b=0.75):
+        os.makedirs(persist_directory, exist_ok=True)
+        self.db_path = os.path.join(persist_directory, "keyword_index.sqlite3")
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, source TEXT NOT NULL, length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "tenant" not in columns:
+            self._conn.execute(f"ALTER TABLE chunks ADD COLUMN tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_tenant ON chunks(tenant)")
+        self._conn.commit()
+
+    def is_built(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM index_meta WHERE key = 'built'").fetchone()
+        return row is not None
+
+    def mark_built(self):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO index_meta VALUES ('built', '1')")
+            self._conn.commit()
+
+    def add(self, chunk_ids: List[str], chunks: List[str], sources: List[str], tenant: str = DEFAULT_TENANT):
+        chunk_rows, posting_rows = [], []
+        for chunk_id, chunk, source in zip(chunk_ids, chunks, sources):
+            counts = Counter(tokenize(chunk))
+            chunk_rows.append((chunk_id, source, sum(counts.values()), tenant))
+            posting_rows.extend((term, chunk_id, tf) for term, tf in counts.items())
+        with self._lock:
+            self._delete_ids(chunk_ids)
+            self._conn.executemany("INSERT INTO chunks (chunk_id, source, length, tenant) VALUES (?, ?, ?, ?)",
+                                   chunk_rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._conn.commit()
+
+    def _delete_ids(self, chunk_ids: List[str]):
+        for start in range(0, len(chunk_ids), 500):
+            part = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", part)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", part)
+
+    def remove_ids(self, chunk_ids: List[str]):
+        with self._lock:
+            self._delete_ids(chunk_ids)
+            self._conn.commit()
+
+    def remove_source(self, source: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE source = ?)", (source,)
+            )
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def search(self, query: str, n_results: int = 10, tenants: List[str] = None) -> List[Tuple[str, float]]:
+        """tenants가 주어지면 해당 테넌트 청크만 대상으로 BM25 통계를 계산"""
+        terms = list(set(tokenize(query)))
+        if not terms:
+            return []
+
+        placeholders = ",".join("?" * len(terms))
+        tenant_filter, tenant_params = "", []
+        if tenants:
+            tenant_filter = f" AND c.tenant IN ({','.join('?' * len(tenants))})"
+            tenant_params = list(tenants)
+        with self._lock, metrics.span("keyword_search"):
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM chunks c WHERE 1 = 1" + tenant_filter, tenant_params
+            ).fetchone()
+            if not total:
+                return []
+            doc_freq = dict(self._conn.execute(
+                f"SELECT p.term, COUNT(*) FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id "
+                f"WHERE p.term IN ({placeholders}){tenant_filter} GROUP BY p.term", terms + tenant_params
+            ).fetchall())
+            rows = self._conn.execute(
+                f"SELECT p.chunk_id, p.term, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id "
+                f"WHERE p.term IN ({placeholders}){tenant_filter}", terms + tenant_params
+            ).fetchall()
+
+        avg_length = avg_length or 1
+        scores = {}
+        for chunk_id, term, tf, length in rows:
+            df = doc_freq[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
@@ -0,0 +1,116 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import uuid
+from datetime import datetime, timezone
+
+# 요청 단위 상관관계 ID (Flask 스레드, Quart 태스크 모두 contextvars로 분리됨)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# 레코드에 항상 붙는 표준 속성 (extra=로 넘긴 필드만 골라내기 위해 사용)
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener = None
+
+def new_request_id(incoming: str = None) -> str:
+    """클라이언트/프록시가 보낸 X-Request-ID가 있으면 이어 쓰고, 없으면 새로 발급"""
+    request_id = (incoming or "").strip()[:64] or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    return request_id
+
+def clear_request_id():
+    # 스레드를 재사용하는 서버에서 다음 요청에 이전 ID가 남지 않도록 요청 종료 시 호출
+    request_id_var.set(None)
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """요청 스레드에서는 메시지 조립과 요청 ID 기록만 하고 큐에 넣음
+    (writer 스레드에서는 요청의 contextvar를 읽을 수 없음)"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.request_id = request_id_var.get()
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def handleError(self, record):
+        # 큐가 가득 차면 요청을 막지 않고 레코드를 버림
+        pass
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _parse_levels(spec: str) -> dict:
+    # "chromadb=WARNING,utils.ingest_queue=DEBUG" 형식
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def _file_handler(log_file: str) -> logging.Handler:
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    backup_count = int(os.getenv('LOG_BACKUP_COUNT', 5))
+    when = os.getenv('LOG_ROTATE_WHEN')
+    if when:
+        # 예: LOG_ROTATE_WHEN=midnight → 하루 단위 회전
+        return logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count,
+                                                         encoding="utf-8", utc=True)
+    return logging.handlers.RotatingFileHandler(log_file, maxBytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+                                                backupCount=backup_count, encoding="utf-8")
+
+def setup_logging(log_file: str = None):
+    """루트 로거를 큐 기반 비동기 로깅으로 구성.
+    요청 스레드는 QueueHandler로 레코드를 넣기만 하고, 파일/콘솔 쓰기는 QueueListener 스레드가 담당.
+    여러 진입점에서 호출돼도 한 번만 구성됨"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_file = log_file or os.getenv('LOG_FILE', 'logs/app.log')
+    formatter = JsonFormatter()
+    handlers = [_file_handler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    queue_handler = RequestQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    # httpx는 OpenAI 호출마다 INFO 로그를, chromadb 텔레메트리는 컬렉션 작업마다 실패 로그를 남기므로 기본으로 낮춤
+    default_levels = 'httpx=WARNING,werkzeug=WARNING,chromadb.telemetry=CRITICAL'
+    for name, level in _parse_levels(os.getenv('LOG_LEVELS', default_levels)).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
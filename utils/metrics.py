@@ -0,0 +1,134 @@
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 초 단위 지연 히스토그램 구간 (임베딩 캐시 적중 수 ms ~ 긴 LLM 응답 수십 초)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for key, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+class MetricsRegistry:
+    """단계별 지연 히스토그램과 카운터를 모아 Prometheus 텍스트 형식으로 노출.
+    METRICS_SAMPLE_RATE(0~1) 비율의 구간만 시간을 측정해 운영 중에도 켜 둘 수 있게 함 (카운터는 항상 기록)"""
+
+    def __init__(self, sample_rate: float = 1.0):
+        self.sample_rate = sample_rate
+        self.stage_seconds = Histogram("rag_stage_seconds", "Latency of each pipeline stage")
+        self.tokens = Counter("rag_tokens_total", "Tokens sent to or received from the LLM")
+        self.cache_events = Counter("rag_cache_events_total", "Cache hits and misses")
+        self.items = Counter("rag_items_total", "Items processed per stage (pages, chunks, queries)")
+        self.errors = Counter("rag_stage_errors_total", "Exceptions raised inside a timed stage")
+        self.coalesced = Counter("rag_coalesced_requests_total",
+                                 "Requests that started (leader) or joined (follower) a shared in-flight call")
+        self._gauge_callbacks: List[Tuple[str, str, Callable[[], Dict]]] = []
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            yield
+            return
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors.inc(stage=stage, **labels)
+            raise
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started_at, stage=stage, **labels)
+
+    def observe(self, stage: str, seconds: float, **labels):
+        """span으로 감쌀 수 없는 구간(예: 스트리밍 첫 토큰까지)의 측정값을 직접 기록"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.stage_seconds.observe(seconds, stage=stage, **labels)
+
+    def add_gauge(self, name: str, help_text: str, callback: Callable[[], Dict]):
+        """스크레이프 시점에 callback()이 반환한 {라벨 튜플: 값}을 게이지로 노출"""
+        self._gauge_callbacks.append((name, help_text, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.tokens, self.cache_events, self.items, self.errors, self.coalesced):
+            lines.extend(metric.render())
+        for name, help_text, callback in self._gauge_callbacks:
+            try:
+                values = callback()
+            except Exception:
+                logger.exception(f"Metrics gauge {name} failed")
+                continue
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge"])
+            for key, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry(sample_rate=float(os.getenv('METRICS_SAMPLE_RATE', 1.0)))
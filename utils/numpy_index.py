@@ -0,0 +1,400 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 저장 형식별 행렬 dtype. int8은 행마다 스케일(float32)을 함께 저장하는 대칭 양자화
+VECTOR_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+# 한 번에 float32로 변환해 곱하는 행 수 (변환용 임시 메모리 상한)
+_SCAN_BLOCK = 8192
+
+class NumpyCollection:
+    """Chroma Collection에서 VectorStore가 쓰는 부분(add/update/delete/get/query/count)만 구현한 정확 검색 컬렉션.
+    정규화된 임베딩은 메모리 맵 행렬에, id/본문/메타데이터는 같은 순서의 JSON Lines 파일(rows-<세대>.jsonl)에 저장.
+    add는 행을 파일 끝에 덧붙이기만 하고, update/delete만 새 세대 파일로 다시 씀 (delete는 행렬도 새 세대로)"""
+
+    def __init__(self, path: str, name: str, metadata: Dict = None, dtype: str = "int8"):
+        self.path = path
+        self.name = name
+        self._lock = threading.RLock()
+        manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            rows = self._load_rows(manifest)
+        else:
+            os.makedirs(path, exist_ok=True)
+            manifest = {"metadata": metadata or {}, "dtype": dtype, "dim": None, "capacity": 0}
+            rows = []
+        self.metadata = manifest["metadata"]
+        self.dtype = manifest["dtype"]
+        self.dim = manifest["dim"]
+        self._capacity = manifest["capacity"]
+        self._rows_file = manifest.get("rows_file")
+        self._rows_bytes = manifest.get("rows_bytes", 0)
+        self._vectors_file = manifest.get("vectors_file", "vectors.dat")
+        self._scales_file = manifest.get("scales_file", "scales.dat")
+        self._ids = [row[0] for row in rows]
+        self._documents = [row[1] for row in rows]
+        self._metadatas = [row[2] for row in rows]
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._vectors = self._scales = None
+        if self._capacity:
+            self._map(self._capacity)
+        if self._rows_file is None:
+            # 새 컬렉션이거나 rows.json 한 파일로 저장하던 이전 형식
+            self._rewrite_rows()
+
+    def _load_rows(self, manifest: Dict) -> List:
+        if "rows_file" not in manifest:
+            with open(os.path.join(self.path, "rows.json"), encoding="utf-8") as f:
+                return json.load(f)
+        # manifest에 확정된 길이까지만 읽음 (그 뒤는 manifest 갱신 전에 중단된 add의 잔여분)
+        with open(os.path.join(self.path, manifest["rows_file"]), "rb") as f:
+            data = f.read(manifest["rows_bytes"])
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    # --- 저장소 ---
+
+    def _map(self, capacity: int):
+        self._vectors = np.memmap(os.path.join(self.path, self._vectors_file), dtype=VECTOR_DTYPES[self.dtype],
+                                  mode="r+", shape=(capacity, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(os.path.join(self.path, self._scales_file), dtype=np.float32,
+                                     mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def _flush(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    def _reserve(self, size: int):
+        if size <= self._capacity:
+            return
+        # 용량을 두 배씩 늘려 파일 재할당 횟수를 줄임
+        capacity = max(size, self._capacity * 2, 1024)
+        self._flush()
+        self._vectors = self._scales = None
+        files = [(self._vectors_file, np.dtype(VECTOR_DTYPES[self.dtype]).itemsize * self.dim)]
+        if self.dtype == "int8":
+            files.append((self._scales_file, 4))
+        for filename, row_bytes in files:
+            with open(os.path.join(self.path, filename), "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._map(capacity)
+
+    def _save_manifest(self):
+        # manifest.json이 마지막 확정 지점: 행렬/행 파일 이름과 유효한 바이트 길이를 기록
+        self._write_json("manifest.json", {"metadata": self.metadata, "dtype": self.dtype, "dim": self.dim,
+                                           "capacity": self._capacity, "rows_file": self._rows_file,
+                                           "rows_bytes": self._rows_bytes, "vectors_file": self._vectors_file,
+                                           "scales_file": self._scales_file})
+
+    @staticmethod
+    def _encode_rows(ids, documents, metadatas) -> bytes:
+        return "".join(json.dumps([chunk_id, document, metadata], ensure_ascii=False) + "\n"
+                       for chunk_id, document, metadata in zip(ids, documents, metadatas)).encode("utf-8")
+
+    def _append_rows(self, ids, documents, metadatas):
+        self._flush()
+        data = self._encode_rows(ids, documents, metadatas)
+        with open(os.path.join(self.path, self._rows_file), "r+b") as f:
+            f.seek(self._rows_bytes)
+            f.truncate()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._rows_bytes += len(data)
+        self._save_manifest()
+
+    def _rewrite_rows(self):
+        """현재 행 전체를 새 세대 파일에 쓰고 manifest를 옮긴 뒤 이전 파일 삭제"""
+        self._flush()
+        previous = self._rows_file
+        generation = int(previous[5:-6]) + 1 if previous else 0
+        self._rows_file = f"rows-{generation}.jsonl"
+        data = self._encode_rows(self._ids, self._documents, self._metadatas)
+        with open(os.path.join(self.path, self._rows_file), "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._rows_bytes = len(data)
+        self._save_manifest()
+        for stale in (previous, "rows.json"):
+            if stale and os.path.exists(os.path.join(self.path, stale)):
+                os.remove(os.path.join(self.path, stale))
+
+    def _compact_vectors(self, keep: List[int]) -> List[str]:
+        """남길 행만 새 세대 행렬 파일로 복사하고 그 파일로 전환. 이전 파일 이름을 반환하며,
+        manifest가 저장되기 전까지는 이전 파일을 건드리지 않으므로 중단돼도 기존 행렬이 그대로 남음"""
+        self._flush()
+        previous = [self._vectors_file, self._scales_file]
+        match = re.fullmatch(r'vectors-(\d+)\.dat', self._vectors_file)
+        generation = int(match.group(1)) + 1 if match else 1
+        vectors_file, scales_file = f"vectors-{generation}.dat", f"scales-{generation}.dat"
+        vectors = scales = None
+        if keep:
+            vectors = np.memmap(os.path.join(self.path, vectors_file), dtype=VECTOR_DTYPES[self.dtype],
+                                mode="w+", shape=(len(keep), self.dim))
+            if self._scales is not None:
+                scales = np.memmap(os.path.join(self.path, scales_file), dtype=np.float32,
+                                   mode="w+", shape=(len(keep),))
+            for start in range(0, len(keep), _SCAN_BLOCK):
+                block = keep[start:start + _SCAN_BLOCK]
+                vectors[start:start + len(block)] = self._vectors[block]
+                if scales is not None:
+                    scales[start:start + len(block)] = self._scales[block]
+            vectors.flush()
+            if scales is not None:
+                scales.flush()
+        self._vectors, self._scales = vectors, scales
+        self._vectors_file, self._scales_file = vectors_file, scales_file
+        self._capacity = len(keep)
+        return previous
+
+    def _write_json(self, filename: str, payload):
+        target = os.path.join(self.path, filename)
+        with open(target + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(target + ".tmp", target)
+
+    def _encode(self, embeddings) -> tuple:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        if self.dtype != "int8":
+            return matrix.astype(VECTOR_DTYPES[self.dtype]), None
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _decode(self, positions) -> np.ndarray:
+        vectors = self._vectors[positions].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[positions][:, None]
+        return vectors
+
+    # --- Chroma 호환 API ---
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids: List[str], embeddings, documents: List[str] = None, metadatas: List[Dict] = None):
+        if not ids:
+            return
+        with self._lock:
+            # Chroma처럼 이미 있는 ID는 건너뜀 (중단 후 재개 시 마지막 배치를 다시 추가하는 경우)
+            fresh, seen = [], set()
+            for i, chunk_id in enumerate(ids):
+                if chunk_id not in self._positions and chunk_id not in seen:
+                    seen.add(chunk_id)
+                    fresh.append(i)
+            if len(fresh) < len(ids):
+                logger.info(f"Skipping {len(ids) - len(fresh)} existing ID(s) in {self.name}")
+                if not fresh:
+                    return
+                ids = [ids[i] for i in fresh]
+                embeddings = [embeddings[i] for i in fresh]
+                documents = [documents[i] for i in fresh] if documents else None
+                metadatas = [metadatas[i] for i in fresh] if metadatas else None
+            if self.dim is None:
+                self.dim = len(embeddings[0])
+            vectors, scales = self._encode(embeddings)
+            start = len(self._ids)
+            self._reserve(start + len(ids))
+            self._vectors[start:start + len(ids)] = vectors
+            if scales is not None:
+                self._scales[start:start + len(ids)] = scales
+            for i, chunk_id in enumerate(ids):
+                self._positions[chunk_id] = start + i
+            documents = documents or [None] * len(ids)
+            metadatas = metadatas or [{} for _ in ids]
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            self._append_rows(ids, documents, metadatas)
+
+    def update(self, ids: List[str], metadatas: List[Dict] = None, documents: List[str] = None):
+        with self._lock:
+            for i, chunk_id in enumerate(ids):
+                position = self._positions.get(chunk_id)
+                if position is None:
+                    continue
+                if metadatas is not None:
+                    self._metadatas[position] = metadatas[i]
+                if documents is not None:
+                    self._documents[position] = documents[i]
+            self._rewrite_rows()
+
+    def _matches(self, position: int, where: Optional[Dict]) -> bool:
+        if not where:
+            return True
+        metadata = self._metadatas[position] or {}
+        for key, condition in where.items():
+            if isinstance(condition, dict):
+                if "$eq" in condition and metadata.get(key) != condition["$eq"]:
+                    return False
+                if "$in" in condition and metadata.get(key) not in condition["$in"]:
+                    return False
+            elif metadata.get(key) != condition:
+                return False
+        return True
+
+    def _select(self, ids: List[str] = None, where: Dict = None) -> List[int]:
+        if ids is not None:
+            positions = [self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions]
+        else:
+            positions = range(len(self._ids))
+        return [position for position in positions if self._matches(position, where)]
+
+    def delete(self, ids: List[str] = None, where: Dict = None):
+        with self._lock:
+            doomed = set(self._select(ids, where))
+            if not doomed:
+                return
+            # 남는 행만 새 행렬 파일로 옮겨 연속으로 유지. 행 파일과 함께 manifest 저장 시점에 확정
+            keep = [position for position in range(len(self._ids)) if position not in doomed]
+            stale = self._compact_vectors(keep)
+            self._ids = [self._ids[p] for p in keep]
+            self._documents = [self._documents[p] for p in keep]
+            self._metadatas = [self._metadatas[p] for p in keep]
+            self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+            self._rewrite_rows()
+            for filename in stale:
+                if os.path.exists(os.path.join(self.path, filename)):
+                    os.remove(os.path.join(self.path, filename))
+
+    def _result_rows(self, positions: List[int], include: List[str]) -> Dict:
+        result = {"ids": [self._ids[p] for p in positions]}
+        result["documents"] = [self._documents[p] for p in positions] if "documents" in include else None
+        result["metadatas"] = [self._metadatas[p] for p in positions] if "metadatas" in include else None
+        result["embeddings"] = (self._decode(positions).tolist() if positions else []) \
+            if "embeddings" in include else None
+        return result
+
+    def get(self, ids: List[str] = None, where: Dict = None, include: List[str] = None,
+            limit: int = None, offset: int = None) -> Dict:
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            positions = self._select(ids, where)
+            positions = positions[offset or 0:(offset or 0) + limit if limit else None]
+            return self._result_rows(positions, include)
+
+    def modify(self, name: str = None, metadata: Dict = None):
+        with self._lock:
+            if metadata is not None:
+                self.metadata = metadata
+            if name and name != self.name:
+                self._flush()
+                self._vectors = self._scales = None
+                new_path = os.path.join(os.path.dirname(self.path), name)
+                if os.path.exists(new_path):
+                    raise ValueError(f"Collection {name} already exists.")
+                os.rename(self.path, new_path)
+                self.path, self.name = new_path, name
+                if self._capacity:
+                    self._map(self._capacity)
+            self._flush()
+            self._save_manifest()
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """(행 수 x 질의 수) 코사인 유사도. 블록 단위로 float32 변환 후 행렬 곱 한 번"""
+        count = len(self._ids)
+        out = np.empty((count, queries.shape[1]), dtype=np.float32)
+        for start in range(0, count, _SCAN_BLOCK):
+            end = min(start + _SCAN_BLOCK, count)
+            block = self._vectors[start:end]
+            out[start:end] = (block if block.dtype == np.float32 else block.astype(np.float32)) @ queries
+            if self._scales is not None:
+                out[start:end] *= self._scales[start:end, None]
+        return out
+
+    def query(self, query_embeddings, n_results: int = 10, include: List[str] = None, where: Dict = None) -> Dict:
+        """여러 질의를 한 번의 행렬 곱으로 처리하고 argpartition으로 top-k만 정렬. 거리는 Chroma cosine과 같은 1 - 유사도"""
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = (queries / np.where(norms == 0, 1, norms)).T
+
+        keys = ["ids", "documents", "metadatas", "embeddings", "distances"]
+        results = {key: [] for key in keys}
+        with self._lock:
+            if not self._ids:
+                return {key: [[] for _ in range(queries.shape[1])] for key in keys}
+            similarities = self.scores(queries)
+            allowed = None
+            if where:
+                allowed = np.zeros(len(self._ids), dtype=bool)
+                allowed[self._select(where=where)] = True
+                similarities[~allowed] = -np.inf
+            k = min(n_results, len(self._ids) if allowed is None else int(allowed.sum()))
+            for column in similarities.T:
+                if k <= 0:
+                    top = np.empty(0, dtype=np.int64)
+                else:
+                    top = np.argpartition(-column, k - 1)[:k]
+                    top = top[np.argsort(-column[top])]
+                rows = self._result_rows(top.tolist(), include)
+                for key in ("ids", "documents", "metadatas", "embeddings"):
+                    results[key].append(rows[key])
+                results["distances"].append((1 - column[top]).tolist() if "distances" in include else None)
+        return results
+
+class NumpyClient:
+    """PersistentClient 대신 쓰는 컬렉션 관리자. 컬렉션마다 <path>/<이름>/ 디렉터리 하나"""
+
+    max_batch_size = 41666
+
+    def __init__(self, path: str, dtype: str = "int8"):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self._collections = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _collection_path(self, name: str) -> str:
+        if not re.fullmatch(r'[A-Za-z0-9][A-Za-z0-9_.-]{0,62}', name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return os.path.join(self.path, name)
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            path = self._collection_path(name)
+            if not os.path.exists(os.path.join(path, "manifest.json")):
+                self._collections.pop(name, None)
+                raise ValueError(f"Collection {name} does not exist.")
+            collection = self._collections.get(name)
+            # modify(name=)로 이름이 바뀐 컬렉션 객체는 이전 이름으로 캐시돼 있을 수 있음
+            if collection is None or collection.name != name:
+                collection = self._collections[name] = NumpyCollection(path, name)
+            return collection
+
+    def create_collection(self, name: str, metadata: Dict = None) -> NumpyCollection:
+        with self._lock:
+            path = self._collection_path(name)
+            if os.path.exists(os.path.join(path, "manifest.json")):
+                raise ValueError(f"Collection {name} already exists.")
+            self._collections[name] = NumpyCollection(path, name, metadata, self.dtype)
+            return self._collections[name]
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(self._collection_path(name), ignore_errors=True)
+
+    def list_collections(self) -> List[NumpyCollection]:
+        names = sorted(entry for entry in os.listdir(self.path)
+                       if os.path.exists(os.path.join(self.path, entry, "manifest.json")))
+        return [self.get_collection(name) for name in names]
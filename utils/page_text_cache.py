@@ -0,0 +1,107 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class PageCacheCorrupt(Exception):
+    """캐시 항목을 읽는 도중 손상이 발견됨 (이미 내보낸 페이지 이후부터 다시 추출해야 함)"""
+
+class PageTextWriter:
+    """추출되는 페이지를 한 줄씩 임시 파일에 기록하고, commit()해야 캐시 항목으로 교체"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._raw = self._file = None
+        self._tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 다른 프로세스(ASGI 워커 풀)가 동시에 읽어도 완성된 파일만 보이도록 임시 파일 후 교체
+            fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            self._raw = os.fdopen(fd, 'wb')
+            self._file = gzip.open(self._raw, 'wt', encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"Page text cache write failed: {str(e)}")
+            self.close()
+
+    def write(self, page_number: int, text: str):
+        if self._file is None:
+            return
+        try:
+            self._file.write(json.dumps([page_number, text], ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"Page text cache write failed: {str(e)}")
+            self.close()
+
+    def commit(self):
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            self._raw.close()
+            os.replace(self._tmp_path, self.path)
+            self._tmp_path = None
+        except OSError as e:
+            logger.warning(f"Page text cache write failed: {str(e)}")
+        self.close()
+
+    def close(self):
+        """commit되지 않은 임시 파일은 버림"""
+        for stream in (self._file, self._raw):
+            if stream is not None:
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+        self._raw = self._file = None
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+
+class PageTextCache:
+    """(파일 내용 해시, 추출기 버전) 기반 페이지 텍스트 디스크 캐시.
+    청킹 설정을 바꿔 다시 색인하거나 같은 파일을 다른 이름으로 올려도 PDF를 다시 파싱하지 않음.
+    항목은 페이지당 한 줄인 gzip JSON Lines라 읽기/쓰기 모두 한 번에 한 페이지만 메모리에 올림"""
+
+    def __init__(self, cache_directory="cache/page_text"):
+        self.cache_directory = cache_directory
+        os.makedirs(cache_directory, exist_ok=True)
+
+    def _path(self, file_hash: str, version: str) -> str:
+        return os.path.join(self.cache_directory, file_hash[:2], f"{file_hash}-{version}.jsonl.gz")
+
+    def iter_pages(self, file_hash: str, version: str) -> Optional[Iterator[Tuple[int, str]]]:
+        """캐시된 (페이지 번호, 텍스트)를 순서대로 내보내는 iterator, 없으면 None.
+        읽는 도중 손상이 발견되면 항목을 지우고 PageCacheCorrupt를 발생시킴"""
+        path = self._path(file_hash, version)
+        if not os.path.exists(path):
+            metrics.cache_events.inc(cache="page_text", result="miss")
+            return None
+        metrics.cache_events.inc(cache="page_text", result="hit")
+        return self._read_pages(path)
+
+    def _read_pages(self, path: str) -> Iterator[Tuple[int, str]]:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                for line in file:
+                    page_number, text = json.loads(line)
+                    yield page_number, text
+        except (OSError, EOFError, ValueError) as e:
+            # 쓰다 만 파일 등 손상된 항목은 지우고 호출한 쪽에서 남은 페이지를 다시 추출
+            logger.warning(f"Page text cache read failed: {str(e)}")
+            self._discard(path)
+            raise PageCacheCorrupt(str(e))
+
+    def _discard(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def writer(self, file_hash: str, version: str) -> PageTextWriter:
+        return PageTextWriter(self._path(file_hash, version))
@@ -0,0 +1,124 @@
+from typing import Dict, List, Tuple
+from utils.token_counter import count_tokens, truncate_tokens
+from utils.retrieval import strip_overlap
+
+class PromptBuilder:
+    """토큰 예산 안에서 시스템 프롬프트, 검색 문맥, 대화 내역을 배분해 메시지를 구성"""
+
+    def __init__(self, model="gpt-3.5-turbo", max_prompt_tokens=2500, history_budget=600,
+                 summary_budget=200, min_overlap=20, max_overlap=300):
+        self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+
+    def _tokens(self, text: str) -> int:
+        # 메시지 하나당 역할/구분자 오버헤드 4토큰 포함
+        return count_tokens(text, self.model) + 4
+
+    def _dedupe(self, relevant_docs: List[dict]) -> List[dict]:
+        by_position = {}
+        for doc in relevant_docs:
+            metadata = doc['metadata']
+            if 'chunk_id' in metadata:
+                by_position[(metadata['source'], metadata['chunk_id'])] = doc['document']
+
+        seen, deduped = set(), []
+        for doc in relevant_docs:
+            text = doc['document']
+            if text in seen:
+                continue
+            seen.add(text)
+            metadata = doc['metadata']
+            previous = by_position.get((metadata['source'], metadata.get('chunk_id', -1) - 1))
+            if previous:
+                text = strip_overlap(previous, text, self.min_overlap, self.max_overlap)
+            if text.strip():
+                deduped.append({**doc, 'document': text})
+        return deduped
+
+    def fit_history(self, history: List[Dict]) -> Tuple[int, int]:
+        """최근 턴부터 history 예산에 들어가는 (턴 수, 토큰 수)"""
+        kept_turns, history_tokens = 0, 0
+        for turn in reversed(history):
+            turn_tokens = self._tokens(turn["user"]) + self._tokens(turn["assistant"])
+            if history_tokens + turn_tokens > self.history_budget:
+                break
+            history_tokens += turn_tokens
+            kept_turns += 1
+        return kept_turns, history_tokens
+
+    def build(self, system_prompt: str, user_message: str, relevant_docs: List[dict],
+              history: List[Dict], summary: str = "") -> Tuple[List[Dict], List[str], Dict]:
+        """(messages, 관련도순 출처, 토큰 사용 내역)을 반환.
+        사용 내역의 overflow_turns는 예산 밖으로 밀려난 오래된 턴 수(요약 대상)"""
+        system_tokens = self._tokens(system_prompt)
+        question_tokens = self._tokens(user_message) + 40  # 질문 템플릿 문구 여유분
+
+        # 1) 이전 대화 요약 + 최근 턴부터 역순으로 history 예산만큼
+        summary_message = None
+        summary_tokens = 0
+        if summary:
+            # 요약문이 예산보다 길면 잘라서 실제로 보내는 양과 집계가 일치하도록 함
+            header = "이전 대화 요약:\n"
+            summary = truncate_tokens(summary, self.summary_budget - self._tokens(header), self.model)
+            summary_message = {"role": "system", "content": header + summary}
+            summary_tokens = self._tokens(summary_message["content"])
+
+        kept_turns, history_tokens = self.fit_history(history)
+        history_messages = []
+        for turn in history[len(history) - kept_turns:]:
+            history_messages.append({"role": "user", "content": turn["user"]})
+            history_messages.append({"role": "assistant", "content": turn["assistant"]})
+
+        # 2) 남은 예산을 검색 문맥에 배분
+        context_budget = self.max_prompt_tokens - system_tokens - question_tokens - summary_tokens - history_tokens
+        sources, source_scores = [], {}
+        context_parts, context_tokens, used, dropped = [], 0, 0, 0
+        docs = self._dedupe(relevant_docs)
+        for i, doc in enumerate(docs):
+            source_name = doc['metadata']['source']
+            part = f"[출처: {source_name}]\n{doc['document']}\n"
+            part_tokens = count_tokens(part, self.model)
+            if context_tokens + part_tokens > context_budget:
+                dropped += 1
+                continue
+            context_parts.append(part)
+            context_tokens += part_tokens
+            used += 1
+
+            if source_name not in sources:
+                sources.append(source_name)
+            # 상위 결과일수록 높은 관련도 점수를 출처별로 누적
+            source_scores[source_name] = source_scores.get(source_name, 0) + (len(docs) - i) / len(docs)
+
+        context = "\n".join(context_parts)
+        user_prompt = f"""업로드하신 문서에서 찾은 관련 내용:
+
+{context}
+질문: {user_message}
+
+위 문서 내용에서 질문과 정확히 일치하는 부분이 있다면 그 내용을 중심으로 답변해주세요."""
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_message:
+            messages.append(summary_message)
+        messages.extend(history_messages)
+        messages.append({"role": "user", "content": user_prompt})
+
+        usage = {
+            "system": system_tokens,
+            "summary": summary_tokens,
+            "history": history_tokens,
+            "context": context_tokens,
+            "question": self._tokens(user_message),
+            "total": sum(self._tokens(message["content"]) for message in messages) + 3,
+            "chunks_used": used,
+            "chunks_dropped": dropped,
+            "history_turns": kept_turns,
+            "overflow_turns": len(history) - kept_turns,
+        }
+        sorted_sources = sorted(sources, key=lambda x: source_scores.get(x, 0), reverse=True)
+        return messages, sorted_sources, usage
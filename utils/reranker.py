@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+from utils.keyword_index import tokenize
+from utils.metrics import metrics
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:  # sentence-transformers 미설치 시 lexical 스코어러만 사용 가능
+    CrossEncoder = None
+
+class LexicalScorer:
+    """모델 없이 쓰는 경량 스코어러: 질의 토큰(한글 2-gram 포함)의 포화 빈도 + 질의 커버리지"""
+
+    def __init__(self, k1=1.2):
+        self.k1 = k1
+
+    def __call__(self, query: str, passages: Sequence[str]) -> List[float]:
+        terms = sorted(set(tokenize(query)))
+        if not terms or not passages:
+            return [0.0] * len(passages)
+        column = {term: j for j, term in enumerate(terms)}
+
+        # 후보 전체를 (후보 x 질의 토큰) 빈도 행렬 하나로 계산
+        counts = np.zeros((len(passages), len(terms)), dtype=np.float32)
+        for i, passage in enumerate(passages):
+            for token in tokenize(passage):
+                j = column.get(token)
+                if j is not None:
+                    counts[i, j] += 1
+        saturated = counts * (self.k1 + 1) / (counts + self.k1)
+        coverage = (counts > 0).mean(axis=1)
+        return (saturated.mean(axis=1) / (self.k1 + 1) + coverage).tolist()
+
+class CrossEncoderScorer:
+    """로컬 CPU cross-encoder. (질의, 후보) 쌍 전체를 한 번의 predict 호출로 배치 추론"""
+
+    def __init__(self, model_name="cross-encoder/mmarco-mMiniLMv2-L12-H384-v1", batch_size=32, max_length=512):
+        if CrossEncoder is None:
+            raise ImportError("sentence-transformers is required for the cross-encoder reranker")
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.batch_size = batch_size
+
+    def __call__(self, query: str, passages: Sequence[str]) -> List[float]:
+        scores = self.model.predict([(query, passage) for passage in passages],
+                                    batch_size=self.batch_size, show_progress_bar=False)
+        return np.asarray(scores, dtype=np.float32).tolist()
+
+class Reranker:
+    """검색 후보를 스코어러로 재정렬해 상위 top_k개만 남김. 점수는 (질의 해시, 청크) 단위로 LRU 캐시"""
+
+    def __init__(self, scorer: Callable[[str, Sequence[str]], List[float]], top_k=4, cache_size=10000):
+        self.scorer = scorer
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _query_hash(query: str) -> str:
+        return hashlib.sha256(" ".join(query.split()).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _chunk_key(doc: dict) -> str:
+        # 같은 id로 내용이 바뀌는 경우(문서 재업로드, 인접 청크 병합)도 구분되도록 본문 해시 포함
+        metadata = doc['metadata']
+        chunk_id = doc.get('id') or f"{metadata['source']}_{metadata.get('chunk_ids', metadata.get('chunk_id'))}"
+        return f"{chunk_id}:{hashlib.sha1(doc['document'].encode('utf-8')).hexdigest()[:16]}"
+
+    def rerank(self, query: str, docs: List[dict], top_k: int = None) -> List[dict]:
+        top_k = top_k or self.top_k
+        if not docs:
+            return []
+
+        query_hash = self._query_hash(query)
+        keys = [(query_hash, self._chunk_key(doc)) for doc in docs]
+        scores = [None] * len(docs)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self.hits += len(docs) - len(missing)
+        self.misses += len(missing)
+        metrics.cache_events.inc(len(docs) - len(missing), cache="rerank", result="hit")
+        metrics.cache_events.inc(len(missing), cache="rerank", result="miss")
+
+        if missing:
+            with metrics.span("rerank_inference"):
+                computed = self.scorer(query, [docs[i]['document'] for i in missing])
+            with self._lock:
+                for i, score in zip(missing, computed):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = scores[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        # 동점이면 기존 검색 순위 유지
+        order = sorted(range(len(docs)), key=lambda i: (-scores[i], i))[:top_k]
+        return [{**docs[i], 'rerank_score': scores[i]} for i in order]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._cache),
+        }
+
+def create_reranker(backend: str = None, **kwargs):
+    """RERANKER 환경변수('none', 'lexical', 'cross-encoder')로 재정렬 단계 선택. 'none'이면 None"""
+    backend = backend or os.getenv('RERANKER', 'none')
+    top_k = int(os.getenv('RERANK_TOP_K', 4))
+    if backend == 'none':
+        return None
+    if backend == 'lexical':
+        return Reranker(LexicalScorer(), top_k=top_k, **kwargs)
+    if backend == 'cross-encoder':
+        model_name = os.getenv('RERANKER_MODEL', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+        return Reranker(CrossEncoderScorer(model_name), top_k=top_k, **kwargs)
+    raise ValueError(f"Unsupported reranker: {backend}")
@@ -0,0 +1,71 @@
+from typing import Dict, List
+
+import numpy as np
+
+def strip_overlap(previous: str, text: str, min_overlap: int = 20, max_overlap: int = 300) -> str:
+    """스플리터의 chunk_overlap 때문에 앞 청크 끝부분과 겹치는 text의 접두부를 제거"""
+    for size in range(min(len(previous), len(text), max_overlap), min_overlap - 1, -1):
+        if previous.endswith(text[:size]):
+            return text[size:].lstrip()
+    return text
+
+def rrf_scores(ranked_id_lists: List[List[str]], rrf_k: int = 60) -> Dict[str, float]:
+    """여러 순위 목록을 reciprocal-rank fusion 점수로 합침"""
+    scores = {}
+    for ranked_ids in ranked_id_lists:
+        for rank, chunk_id in enumerate(ranked_ids):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return scores
+
+def cosine_similarities(query_embedding: List[float], embeddings) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    norms[norms == 0] = 1.0
+    return matrix @ query / norms
+
+def mmr_select(query_similarities: np.ndarray, embeddings, k: int, mmr_lambda: float = 0.7) -> List[int]:
+    """Maximal marginal relevance: 질의 관련도는 높고 이미 고른 결과와는 덜 겹치는 순서로 인덱스 선택"""
+    if len(query_similarities) == 0:
+        return []
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    pairwise = matrix @ matrix.T
+
+    selected = [int(np.argmax(query_similarities))]
+    candidates = set(range(len(query_similarities))) - set(selected)
+    while candidates and len(selected) < k:
+        remaining = list(candidates)
+        redundancy = pairwise[np.ix_(remaining, selected)].max(axis=1)
+        scores = mmr_lambda * query_similarities[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining[int(np.argmax(scores))]
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+def merge_adjacent(hits: List[dict]) -> List[dict]:
+    """같은 출처에서 chunk_id가 연속된 결과를 하나의 구절로 합침 (순서는 구성 청크 중 최고 순위 기준)"""
+    groups = {}
+    for rank, hit in enumerate(hits):
+        metadata = hit['metadata']
+        groups.setdefault(metadata['source'], []).append((metadata.get('chunk_id', -1), rank, hit))
+
+    passages = []
+    for source, members in groups.items():
+        members.sort(key=lambda member: member[0])
+        current = None
+        for chunk_id, rank, hit in members:
+            if current is not None and chunk_id >= 0 and chunk_id == current['metadata']['chunk_ids'][-1] + 1:
+                current['document'] += "\n" + strip_overlap(current['document'], hit['document'])
+                current['metadata']['chunk_ids'].append(chunk_id)
+                current['rank'] = min(current['rank'], rank)
+                if hit.get('distance') is not None:
+                    current['distance'] = min(d for d in (current.get('distance'), hit['distance']) if d is not None)
+                continue
+            current = dict(hit)
+            current['metadata'] = {**hit['metadata'], 'chunk_ids': [chunk_id]}
+            current['rank'] = rank
+            passages.append(current)
+
+    passages.sort(key=lambda passage: passage.pop('rank'))
+    return passages
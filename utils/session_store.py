@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List
+
+class SessionStore:
+    """대화 세션 저장소 인터페이스. 세션마다 최근 max_turns개 턴만 보관"""
+
+    def __init__(self, max_turns=10, max_turn_chars=4000, max_sessions=10000, ttl_seconds=24 * 3600):
+        self.max_turns = max_turns
+        self.max_turn_chars = max_turn_chars
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+
+    def _trim_turn(self, user_message: str, assistant_response: str) -> Dict:
+        return {
+            "id": uuid.uuid4().hex,
+            "user": user_message[:self.max_turn_chars],
+            "assistant": assistant_response[:self.max_turn_chars],
+        }
+
+    @staticmethod
+    def turn_key(turn: Dict) -> str:
+        # id가 없는 이전 형식의 턴은 본문으로 식별
+        return turn.get("id") or json.dumps([turn["user"], turn["assistant"]], ensure_ascii=False)
+
+    def _without(self, turns: List[Dict], turn_keys) -> List[Dict]:
+        turn_keys = set(turn_keys)
+        return [turn for turn in turns if self.turn_key(turn) not in turn_keys]
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def append_turn(self, session_id: str, user_message: str, assistant_response: str):
+        raise NotImplementedError
+
+    def clear(self, session_id: str):
+        raise NotImplementedError
+
+    def get_summary(self, session_id: str) -> str:
+        raise NotImplementedError
+
+    def compact(self, session_id: str, turn_keys: List[str], summary: str):
+        """요약에 반영된 턴(turn_key 목록)을 요약문(summary)으로 대체.
+        요약하는 동안 새 턴이 추가돼 창이 밀려도 요약되지 않은 턴은 지우지 않도록 개수가 아니라 턴 식별자로 제거"""
+        raise NotImplementedError
+
+class MemorySessionStore(SessionStore):
+    """프로세스 내 LRU + TTL 세션 저장소"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions = OrderedDict()  # session_id -> (last_access, turns, summary)
+        self._lock = threading.Lock()
+
+    def _live_entry(self, session_id: str):
+        # 만료된 세션은 지우고, 읽힌 세션은 LRU 순서상 가장 최근으로 옮겨 바쁜 세션이 먼저 밀려나지 않게 함
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return entry
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            entry = self._live_entry(session_id)
+            return list(entry[1]) if entry else []
+
+    def append_turn(self, session_id: str, user_message: str, assistant_response: str):
+        with self._lock:
+            _, turns, summary = self._sessions.pop(session_id, (None, [], ""))
+            turns = (turns + [self._trim_turn(user_message, assistant_response)])[-self.max_turns:]
+            self._sessions[session_id] = (time.time(), turns, summary)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            entry = self._live_entry(session_id)
+            return entry[2] if entry else ""
+
+    def compact(self, session_id: str, turn_keys: List[str], summary: str):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            last_access, turns, _ = entry
+            self._sessions[session_id] = (last_access, self._without(turns, turn_keys), summary)
+
+class SQLiteSessionStore(SessionStore):
+    """여러 워커 프로세스가 함께 쓰는 로컬 디스크(SQLite) 세션 저장소"""
+
+    def __init__(self, db_path="cache/sessions.sqlite3", **kwargs):
+        super().__init__(**kwargs)
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, turns TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "summary" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+
+    def get_history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT turns, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return []
+        return json.loads(row[0])
+
+    def append_turn(self, session_id: str, user_message: str, assistant_response: str):
+        now = time.time()
+        with self._lock:
+            # 다른 프로세스와 동시에 같은 세션을 갱신해도 턴이 유실되지 않도록 쓰기 트랜잭션 안에서 읽고 씀
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT turns, last_access, summary FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                alive = row and now - row[1] <= self.ttl_seconds
+                turns = json.loads(row[0]) if alive else []
+                summary = row[2] if alive else ""
+                turns = (turns + [self._trim_turn(user_message, assistant_response)])[-self.max_turns:]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (session_id, turns, last_access, summary) VALUES (?, ?, ?, ?)",
+                    (session_id, json.dumps(turns, ensure_ascii=False), now, summary)
+                )
+                self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl_seconds,))
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN (SELECT session_id FROM sessions "
+                    "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def get_summary(self, session_id: str) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        # 만료된 세션의 요약은 get_history와 마찬가지로 없는 것으로 취급
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return ""
+        return row[0]
+
+    def compact(self, session_id: str, turn_keys: List[str], summary: str):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT turns FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if row is not None:
+                    turns = self._without(json.loads(row[0]), turn_keys)
+                    self._conn.execute(
+                        "UPDATE sessions SET turns = ?, summary = ? WHERE session_id = ?",
+                        (json.dumps(turns, ensure_ascii=False), summary, session_id)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+def create_session_store(backend: str = None, **kwargs) -> SessionStore:
+    """SESSION_STORE 환경변수('memory' 또는 'sqlite')로 백엔드 선택"""
+    backend = backend or os.getenv('SESSION_STORE', 'memory')
+    if backend == 'sqlite':
+        return SQLiteSessionStore(db_path=os.getenv('SESSION_DB_PATH', 'cache/sessions.sqlite3'), **kwargs)
+    if backend == 'memory':
+        return MemorySessionStore(**kwargs)
+    raise ValueError(f"Unsupported session store: {backend}")
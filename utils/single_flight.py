@@ -0,0 +1,192 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Tuple
+
+from utils.metrics import metrics
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _Broadcast:
+    """생산자 스레드가 넣는 조각을 여러 구독자에게 처음부터 순서대로 전달"""
+
+    def __init__(self):
+        self._items = []
+        self._closed = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def pump(self, iterator: Iterator, on_close: Callable[[], None]):
+        try:
+            for item in iterator:
+                with self._cond:
+                    self._items.append(item)
+                    self._cond.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            on_close()
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+
+    def __iter__(self) -> Iterator:
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._items) and not self._closed:
+                    self._cond.wait()
+                if index >= len(self._items):
+                    if self._error is not None:
+                        raise self._error
+                    return
+                item = self._items[index]
+            index += 1
+            yield item
+
+class SingleFlight:
+    """같은 키로 동시에 들어온 호출을 한 번의 실행으로 합치는 그룹 (스레드용).
+    먼저 온 호출(leader)만 실제로 실행하고, 실행 중에 합류한 호출(follower)은 같은 결과를 받음"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key, factory):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = factory()
+        metrics.coalesced.inc(flight=self.name, role="leader" if leader else "follower")
+        return call, leader
+
+    def _release(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key, fn: Callable[[], Any]) -> Any:
+        call, leader = self._join(key, _Call)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._release(key, call)
+            call.done.set()
+
+    def stream(self, key, fn: Callable[[], Tuple[Any, Iterator]]) -> Tuple[Any, Iterator]:
+        """fn()은 (head, 조각 iterator)를 반환. iterator는 별도 스레드에서 끝까지 소비되므로
+        leader 클라이언트가 중간에 끊겨도 합류한 요청은 전체 스트림을 받고, 스트림이 끝날 때까지 새 요청도 합류함"""
+        call, leader = self._join(key, _Call)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            head, broadcast = call.result
+            return head, iter(broadcast)
+        try:
+            head, iterator = fn()
+            broadcast = _Broadcast()
+            threading.Thread(target=broadcast.pump, args=(iterator, lambda: self._release(key, call)),
+                             name=f"{self.name}-stream", daemon=True).start()
+            call.result = (head, broadcast)
+            return head, iter(broadcast)
+        except Exception as e:
+            call.error = e
+            self._release(key, call)
+            raise
+        finally:
+            call.done.set()
+
+class _AsyncBroadcast:
+    def __init__(self):
+        self._items = []
+        self._closed = False
+        self._error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, iterator: AsyncIterator, on_close: Callable[[], None]):
+        try:
+            async for item in iterator:
+                self._items.append(item)
+                self._notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            on_close()
+            self._closed = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator:
+        index = 0
+        while True:
+            if index < len(self._items):
+                index += 1
+                yield self._items[index - 1]
+            elif self._closed:
+                if self._error is not None:
+                    raise self._error
+                return
+            else:
+                await self._changed.wait()
+
+class AsyncSingleFlight:
+    """SingleFlight의 asyncio 버전. 공유 실행은 별도 태스크로 돌려 leader 요청이 취소돼도 follower에 영향이 없음"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Any, asyncio.Task] = {}
+        self._tasks = set()
+
+    def _join(self, key, start: Callable[[], Awaitable]) -> asyncio.Task:
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            task = self._calls[key] = asyncio.ensure_future(start())
+        metrics.coalesced.inc(flight=self.name, role="leader" if leader else "follower")
+        return task
+
+    def _release(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def do(self, key, fn: Callable[[], Awaitable]) -> Any:
+        task = self._join(key, fn)
+        task.add_done_callback(lambda done: self._release(key, done))
+        return await asyncio.shield(task)
+
+    async def stream(self, key, fn: Callable[[], Awaitable[Tuple[Any, AsyncIterator]]]) -> Tuple[Any, AsyncIterator]:
+        async def start():
+            task = asyncio.current_task()
+            try:
+                head, iterator = await fn()
+            except BaseException:
+                self._release(key, task)
+                raise
+            broadcast = _AsyncBroadcast()
+            # 응답 스트림은 요청과 무관한 태스크에서 끝까지 소비하고, 끝나면 키를 해제
+            pump = asyncio.ensure_future(broadcast.pump(iterator, lambda: self._release(key, task)))
+            self._tasks.add(pump)
+            pump.add_done_callback(self._tasks.discard)
+            return head, broadcast
+
+        task = self._join(key, start)
+        head, broadcast = await asyncio.shield(task)
+        return head, broadcast.subscribe()
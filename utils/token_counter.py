@@ -0,0 +1,66 @@
+import logging
+from typing import List
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 미설치 시 근사치 사용
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+_warned_fallback = False
+
+_encodings = {}
+
+def _get_encoding(model: str):
+    global _warned_fallback
+    if tiktoken is None:
+        if not _warned_fallback:
+            # 청크/프롬프트 토큰 예산이 글자 수 근사치로 계산되므로 한 번은 알림
+            _warned_fallback = True
+            logger.warning("tiktoken is not installed; token counts use a character-based estimate")
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def _estimate_tokens(text: str) -> int:
+    # cl100k 기준 근사: 한글 등 비ASCII 문자는 글자당 약 1토큰, ASCII는 4글자당 약 1토큰
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    ascii_count = len(text) - non_ascii
+    return non_ascii + (ascii_count + 3) // 4
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    """앞에서부터 max_tokens 토큰까지만 남긴 텍스트"""
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    non_ascii, ascii_count = 0, 0
+    for index, ch in enumerate(text):
+        if ord(ch) > 127:
+            non_ascii += 1
+        else:
+            ascii_count += 1
+        if non_ascii + (ascii_count + 3) // 4 > max_tokens:
+            return text[:index]
+    return text
+
+def count_message_tokens(messages: List[dict], model: str = "gpt-3.5-turbo") -> int:
+    # 메시지당 역할/구분자 오버헤드 포함
+    total = 3
+    for message in messages:
+        total += 4 + count_tokens(message.get("content", ""), model)
+    return total
@@ -1,96 +1,543 @@
-import chromadb
-from chromadb.config import Settings
-import openai
 import os
-from typing import List
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+from utils.collection_swap import recover_all
+from utils.embedding_cache import EmbeddingCache
+from utils.embedding_pipeline import EmbeddingPipeline, RateLimiter
+from utils.embedding_provider import EmbeddingProvider, create_embedding_provider
+from utils.document_registry import DocumentRegistry, DEFAULT_TENANT
+from utils.keyword_index import KeywordIndex
+from utils.metrics import metrics
+from utils.numpy_index import NumpyClient
+from utils.retrieval import rrf_scores, cosine_similarities, mmr_select, merge_adjacent
+
+logger = logging.getLogger(__name__)
+
+# 모델 기록이 없는 기존 컬렉션은 모두 이 모델로 임베딩되어 있음
+LEGACY_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# 임베딩 모델별 코사인 거리 컷오프. ada-002는 관련 없는 문장끼리도 유사도가 0.7 안팎이라 좁게 자르고,
+# 분포를 측정하지 않은 모델(로컬 sentence-transformers 등)은 컷오프 없이 RRF/MMR로만 고름.
+# RETRIEVAL_MAX_DISTANCE를 지정하면 모델과 무관하게 그 값을 사용
+MAX_DISTANCE_BY_MODEL = {
+    "text-embedding-ada-002": 0.35,
+}
+
+# HNSW 색인 프로파일 (HNSW_PROFILE). M/construction_ef는 색인 생성 시에만 적용되므로
+# 기존 컬렉션의 프로파일을 바꾸려면 `python manage.py rebuild-index --profile <이름>`으로 재구성
+HNSW_PROFILES = {
+    "latency": {"hnsw:M": 12, "hnsw:construction_ef": 100, "hnsw:search_ef": 32,
+                "hnsw:batch_size": 500, "hnsw:sync_threshold": 2000},
+    "balanced": {"hnsw:M": 16, "hnsw:construction_ef": 200, "hnsw:search_ef": 64,
+                 "hnsw:batch_size": 500, "hnsw:sync_threshold": 2000},
+    "recall": {"hnsw:M": 32, "hnsw:construction_ef": 400, "hnsw:search_ef": 200,
+               "hnsw:batch_size": 500, "hnsw:sync_threshold": 2000},
+}
+
+def collection_metadata(embedding_model: str, tenant: str = DEFAULT_TENANT, profile: str = "balanced") -> Dict:
+    if profile not in HNSW_PROFILES:
+        raise ValueError(f"Unknown HNSW profile: {profile}")
+    return {"hnsw:space": "cosine", **HNSW_PROFILES[profile], "hnsw_profile": profile,
+            "embedding_model": embedding_model, "tenant": tenant}
 
 class VectorStore:
-    def __init__(self, collection_name="documents", persist_directory="data"):
+    def __init__(self, collection_name="documents", persist_directory="data",
+                 cache_directory="cache", embedding_model=None, embedding_provider: EmbeddingProvider = None):
         self.collection_name = collection_name
         self.persist_directory = persist_directory
+        # EMBEDDING_PROVIDER=local이면 네트워크 없이 CPU에서 임베딩
+        self.embedding_provider = embedding_provider or create_embedding_provider(model=embedding_model)
+        self.embedding_model = self.embedding_provider.name
+        self.hnsw_profile = os.getenv('HNSW_PROFILE', 'balanced')
+        max_distance = os.getenv('RETRIEVAL_MAX_DISTANCE')
+        self.max_distance = float(max_distance) if max_distance else MAX_DISTANCE_BY_MODEL.get(self.embedding_model)
+        self.embedding_cache = EmbeddingCache(cache_directory)
+        self.embedding_pipeline = create_embedding_pipeline(self.embedding_provider)
         
-        openai.api_key = os.getenv('OPENAI_API_KEY')
-        
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(anonymized_telemetry=False)
+        # VECTOR_BACKEND=numpy: Chroma/HNSW 대신 메모리 맵 행렬 기반 정확 검색 (수천~수만 청크 규모용)
+        self.vector_backend = os.getenv('VECTOR_BACKEND', 'chroma')
+        if self.vector_backend == 'numpy':
+            self.client = NumpyClient(os.path.join(persist_directory, "numpy"),
+                                      dtype=os.getenv('NUMPY_VECTOR_DTYPE', 'int8'))
+        elif self.vector_backend == 'chroma':
+            # chromadb는 임포트만으로도 시작 시간이 길어 사용할 때만 불러옴
+            import chromadb
+            from chromadb.config import Settings
+            self.client = chromadb.PersistentClient(
+                path=persist_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            raise ValueError(f"Unsupported vector backend: {self.vector_backend}")
+        # 재임베딩/재구성 중 교체 단계에서 중단돼 백업 이름으로만 남은 컬렉션을 원래 이름으로 되돌림
+        recover_all(self.client)
+        # 테넌트(부서)마다 별도 컬렉션(HNSW 색인)을 두고, 기본 테넌트는 기존 컬렉션을 그대로 사용
+        self._collections = {}
+        self._collections_lock = threading.Lock()
+        self._search_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SEARCH_FANOUT_WORKERS', 8)), thread_name_prefix="shard-search"
         )
+        self.collection = self.get_collection(DEFAULT_TENANT)
         
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        # 문서가 추가/갱신/삭제될 때 호출되는 콜백 (예: 답변 캐시 무효화)
+        self._change_listeners = []
+        
+        # 문서 목록/삭제용 레지스트리와 키워드 역색인 (기존 데이터가 있으면 최초 1회만 전체 스캔)
+        self.registry = DocumentRegistry(persist_directory)
+        self.keyword_index = KeywordIndex(persist_directory)
+        if not self.registry.is_built() or not self.keyword_index.is_built():
+            all_docs = self.collection.get(include=["metadatas", "documents"])
+            if not self.registry.is_built():
+                self.registry.rebuild(all_docs['ids'], all_docs['metadatas'], all_docs['documents'])
+            if not self.keyword_index.is_built():
+                self.keyword_index.add(all_docs['ids'], all_docs['documents'],
+                                       [metadata.get('source', '') for metadata in all_docs['metadatas']])
+                self.keyword_index.mark_built()
     
-    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        response = openai.embeddings.create(
-            input=texts,
-            model="text-embedding-ada-002"
-        )
-        return [item.embedding for item in response.data]
+    def _get_embeddings(self, texts: List[str], embed_fn=None) -> List[List[float]]:
+        # 캐시에 없는 텍스트만 임베딩 백엔드로 요청.
+        # 청크 임베딩은 embed_fn으로 파이프라인을 넘겨 캐시 미스만 RPM/TPM 한도를 소모하게 함
+        cached = self.embedding_cache.get_many(self.embedding_model, texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = (embed_fn or self.embedding_provider.embed)(missing_texts)
+            self.embedding_cache.put_many(self.embedding_model, missing_texts, new_embeddings)
+            for i, embedding in zip(missing, new_embeddings):
+                cached[i] = embedding
+        
+        return [cached[i] for i in range(len(texts))]
+    
+    async def _aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # 비동기 서버용: 이벤트 루프를 막지 않도록 캐시 조회는 스레드에서, 임베딩은 백엔드의 비동기 경로로 처리
+        cached = await asyncio.to_thread(self.embedding_cache.get_many, self.embedding_model, texts)
+        missing = [i for i in range(len(texts)) if i not in cached]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = await self.embedding_provider.aembed(missing_texts)
+            await asyncio.to_thread(self.embedding_cache.put_many, self.embedding_model, missing_texts, new_embeddings)
+            for i, embedding in zip(missing, new_embeddings):
+                cached[i] = embedding
+        
+        return [cached[i] for i in range(len(texts))]
+    
+    def _open_collection(self, collection_name: str, tenant: str = DEFAULT_TENANT):
+        """컬렉션을 열고 저장된 벡터의 임베딩 모델이 현재 백엔드와 같은지 확인"""
+        try:
+            collection = self.client.get_collection(collection_name)
+        except ValueError:
+            return self.client.create_collection(
+                name=collection_name,
+                metadata=collection_metadata(self.embedding_model, tenant, self.hnsw_profile)
+            )
+        
+        recorded_model = (collection.metadata or {}).get("embedding_model", LEGACY_EMBEDDING_MODEL)
+        if recorded_model != self.embedding_model:
+            if collection.count() == 0:
+                self.client.delete_collection(collection_name)
+                return self._open_collection(collection_name, tenant)
+            raise ValueError(
+                f"Collection '{collection_name}' was embedded with {recorded_model}, not {self.embedding_model}. "
+                f"Run `python manage.py reembed --collection {collection_name}` with the new provider settings first."
+            )
+        recorded_profile = (collection.metadata or {}).get("hnsw_profile", "default")
+        if self.vector_backend == 'chroma' and recorded_profile != self.hnsw_profile:
+            logger.warning(f"Collection '{collection_name}' uses HNSW profile '{recorded_profile}', not '{self.hnsw_profile}'. "
+                           f"Run `python manage.py rebuild-index --collection {collection_name}` to apply it.")
+        return collection
+    
+    def _collection_name(self, tenant: str) -> str:
+        if tenant == DEFAULT_TENANT:
+            return self.collection_name
+        # Chroma 컬렉션 이름 규칙(영숫자/_-, 63자 이하)에 맞지 않는 테넌트명(예: 한글 부서명)은 해시로 대체
+        if re.fullmatch(r'[A-Za-z0-9][A-Za-z0-9_-]{0,39}', tenant):
+            return f"{self.collection_name}-{tenant}"
+        return f"{self.collection_name}-t{hashlib.sha1(tenant.encode('utf-8')).hexdigest()[:12]}"
     
-    def add_documents(self, chunks: List[str], document_name: str):
+    def get_collection(self, tenant: str = None):
+        tenant = tenant or DEFAULT_TENANT
+        with self._collections_lock:
+            if tenant not in self._collections:
+                self._collections[tenant] = self._open_collection(self._collection_name(tenant), tenant)
+            return self._collections[tenant]
+    
+    def list_tenants(self) -> List[str]:
+        return self.registry.list_tenants()
+    
+    def _route(self, tenants: List[str] = None) -> List[str]:
+        """검색할 샤드(테넌트) 결정: 지정된 테넌트 중 문서가 있는 것만, 지정이 없으면 전체"""
+        known = self.registry.list_tenants()
+        if tenants:
+            return [tenant for tenant in dict.fromkeys(tenants) if tenant in known]
+        return known
+    
+    def _tenant_for(self, document_name: str, tenant: str = None) -> str:
+        entry = self.registry.get(document_name)
+        if entry is None:
+            return tenant or DEFAULT_TENANT
+        if tenant and tenant != entry['tenant']:
+            raise ValueError(f"Document {document_name} already belongs to tenant {entry['tenant']}")
+        return entry['tenant']
+    
+    def get_cache_stats(self) -> Dict:
+        return self.embedding_cache.stats()
+    
+    def add_change_listener(self, callback):
+        """callback(document_name, change)을 등록. change는 'added', 'updated', 'deleted' 중 하나"""
+        self._change_listeners.append(callback)
+    
+    def _notify_change(self, document_name: str, change: str):
+        for callback in self._change_listeners:
+            try:
+                callback(document_name, change)
+            except Exception:
+                logger.exception("Change listener failed", extra={"document": document_name, "change": change})
+    
+    def embed_query(self, query: str) -> List[float]:
+        with metrics.span("embed_query"):
+            return self._get_embeddings([query])[0]
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        with metrics.span("embed_query"):
+            return (await self._aget_embeddings([query]))[0]
+    
+    def add_documents(self, chunks: List[str], document_name: str, start_index: int = 0,
+                      commit_size: int = 256, progress_callback=None, chunk_metadatas: List[dict] = None,
+                      tenant: str = None):
+        """청크를 임베딩해 tenant 컬렉션에 저장. start_index 이전 청크는 이미 기록된 것으로 보고 건너뜀.
+        progress_callback(stage, count)는 'embedded'/'written' 단계마다 누적 개수로 호출됨.
+        chunk_metadatas가 있으면 청크별 메타데이터(예: 페이지 번호)를 함께 저장"""
         if not chunks:
             raise ValueError("No chunks to process")
+        tenant = self._tenant_for(document_name, tenant)
         
-        print(f"Processing {len(chunks)} chunks for {document_name}")
+        logger.info(f"Processing {len(chunks)} chunks for {document_name}")
         
         try:
-            batch_size = 10
-            for i in range(0, len(chunks), batch_size):
-                batch_chunks = chunks[i:i+batch_size]
-                print(f"Processing batch {i//batch_size + 1}/{(len(chunks) + batch_size - 1)//batch_size}")
-                
-                embeddings = self._get_embeddings(batch_chunks)
+            # 청크를 동시에 임베딩한 뒤 Chroma에는 큰 단위(commit_size)로 기록
+            for i in range(start_index, len(chunks), commit_size):
+                batch_chunks = chunks[i:i+commit_size]
+                with metrics.span("embed_chunks"):
+                    embeddings = self._get_embeddings(batch_chunks, self.embedding_pipeline.embed)
+                metrics.items.inc(len(batch_chunks), stage="embed_chunks", kind="chunks")
+                if progress_callback:
+                    progress_callback('embedded', i + len(batch_chunks))
                 
                 ids = [f"{document_name}_{i+j}" for j in range(len(batch_chunks))]
-                metadatas = [{"source": document_name, "chunk_id": i+j} for j in range(len(batch_chunks))]
-                
-                self.collection.add(
-                    documents=batch_chunks,
-                    embeddings=embeddings,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-        except Exception as e:
-            print(f"Error in add_documents: {str(e)}")
+                metadatas = [{"source": document_name, "chunk_id": i+j, "chunk_hash": self._chunk_hash(chunk)}
+                             for j, chunk in enumerate(batch_chunks)]
+                if chunk_metadatas:
+                    for j, metadata in enumerate(metadatas):
+                        metadata.update(chunk_metadatas[i+j])
+                with metrics.span("chroma_write"):
+                    self._bulk_add(ids, batch_chunks, embeddings, metadatas, tenant)
+                    self.registry.add_chunks(document_name, ids, batch_chunks, tenant)
+                if progress_callback:
+                    progress_callback('written', i + len(batch_chunks))
+        except Exception:
+            logger.exception("Error in add_documents", extra={"document": document_name})
             raise
+        
+        self._notify_change(document_name, 'added')
+    
+    @staticmethod
+    def _chunk_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def has_document(self, document_name: str) -> bool:
+        return self.registry.get(document_name) is not None
+    
+    def find_duplicate(self, content_hash: str, tenant: str = None) -> Optional[str]:
+        """tenant에 바이트 단위로 같은 파일이 이미 색인돼 있으면 그 문서 이름"""
+        return self.registry.find_by_hash(content_hash, tenant or DEFAULT_TENANT)
+    
+    def set_content_hash(self, document_name: str, content_hash: str):
+        # 색인이 끝난 뒤 호출 (도중에 실패한 문서가 중복 판별에 걸리지 않도록)
+        self.registry.set_content_hash(document_name, content_hash)
     
-    def search(self, query: str, n_results: int = 5) -> List[dict]:
+    def update_document(self, chunks: List[str], document_name: str,
+                        chunk_metadatas: List[dict] = None, tenant: str = None) -> Dict:
+        """저장된 청크 해시와 비교해 새 청크만 임베딩/추가하고 사라진 청크는 삭제"""
+        if not chunks:
+            raise ValueError("No chunks to process")
+        tenant = self._tenant_for(document_name, tenant)
+        collection = self.get_collection(tenant)
+        
+        existing = collection.get(where={"source": document_name}, include=["metadatas", "documents"])
+        # 해시 → 기존 청크 ID 목록 (해시가 없는 예전 데이터는 본문으로 계산)
+        existing_by_hash = {}
+        for chunk_id, metadata, document in zip(existing['ids'], existing['metadatas'], existing['documents']):
+            chunk_hash = metadata.get('chunk_hash') or self._chunk_hash(document)
+            existing_by_hash.setdefault(chunk_hash, []).append(chunk_id)
+        
+        reused_ids, reused_metadatas = [], []
+        new_ids, new_chunks, new_metadatas = [], [], []
+        for i, chunk in enumerate(chunks):
+            chunk_hash = self._chunk_hash(chunk)
+            metadata = {"source": document_name, "chunk_id": i, "chunk_hash": chunk_hash}
+            if chunk_metadatas:
+                metadata.update(chunk_metadatas[i])
+            
+            if existing_by_hash.get(chunk_hash):
+                reused_ids.append(existing_by_hash[chunk_hash].pop())
+                reused_metadatas.append(metadata)
+            else:
+                new_ids.append(f"{document_name}_{chunk_hash[:16]}_{i}")
+                new_chunks.append(chunk)
+                new_metadatas.append(metadata)
+        
+        stale_ids = [chunk_id for ids in existing_by_hash.values() for chunk_id in ids]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            self.keyword_index.remove_ids(stale_ids)
+        
+        # 재사용 청크는 임베딩 없이 위치/페이지 메타데이터만 갱신
+        write_size = self.client.max_batch_size
+        for i in range(0, len(reused_ids), write_size):
+            collection.update(ids=reused_ids[i:i+write_size], metadatas=reused_metadatas[i:i+write_size])
+        
+        if new_chunks:
+            with metrics.span("embed_chunks"):
+                embeddings = self._get_embeddings(new_chunks, self.embedding_pipeline.embed)
+            metrics.items.inc(len(new_chunks), stage="embed_chunks", kind="chunks")
+            with metrics.span("chroma_write"):
+                self._bulk_add(new_ids, new_chunks, embeddings, new_metadatas, tenant)
+        metrics.items.inc(len(reused_ids), stage="update_document", kind="reused_chunks")
+        
+        self.registry.replace_chunks(document_name, reused_ids + new_ids, sum(len(chunk) for chunk in chunks), tenant)
+        
+        self._notify_change(document_name, 'updated')
+        
+        summary = {"reused": len(reused_ids), "embedded": len(new_chunks), "deleted": len(stale_ids)}
+        logger.info(f"Updated {document_name}: {summary}")
+        return summary
+    
+    def _bulk_add(self, ids: List[str], documents: List[str], embeddings: List[List[float]],
+                  metadatas: List[dict], tenant: str = DEFAULT_TENANT):
+        collection = self.get_collection(tenant)
+        write_size = self.client.max_batch_size
+        for i in range(0, len(ids), write_size):
+            collection.add(
+                documents=documents[i:i+write_size],
+                embeddings=embeddings[i:i+write_size],
+                metadatas=metadatas[i:i+write_size],
+                ids=ids[i:i+write_size]
+            )
+        self.keyword_index.add(ids, documents, [metadata['source'] for metadata in metadatas], tenant)
+    
+    def search(self, query: str, n_results: int = 5, tenants: List[str] = None) -> List[dict]:
         query_embedding = self._get_embeddings([query])[0]
+        return self._query(query_embedding, n_results, tenants)
+    
+    async def asearch(self, query: str, n_results: int = 5, tenants: List[str] = None) -> List[dict]:
+        query_embedding = (await self._aget_embeddings([query]))[0]
+        return await asyncio.to_thread(self._query, query_embedding, n_results, tenants)
+    
+    def hybrid_search(self, query: str, n_results: int = 5, candidates: int = 20,
+                      query_embedding: List[float] = None, tenants: List[str] = None) -> List[dict]:
+        """벡터 검색과 BM25 키워드 검색 결과를 RRF(reciprocal-rank fusion)로 합침"""
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        vector_hits = self._query(query_embedding, candidates, tenants)
+        keyword_hits = self.keyword_index.search(query, candidates, tenants)
+        return self._fuse(vector_hits, keyword_hits, n_results, tenants)
+    
+    async def ahybrid_search(self, query: str, n_results: int = 5, candidates: int = 20,
+                             query_embedding: List[float] = None, tenants: List[str] = None) -> List[dict]:
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query)
+        vector_hits = await asyncio.to_thread(self._query, query_embedding, candidates, tenants)
+        keyword_hits = await asyncio.to_thread(self.keyword_index.search, query, candidates, tenants)
+        return await asyncio.to_thread(self._fuse, vector_hits, keyword_hits, n_results, tenants)
+    
+    def _fuse(self, vector_hits: List[dict], keyword_hits: List[tuple], n_results: int,
+              tenants: List[str] = None, rrf_k: int = 60) -> List[dict]:
+        hits_by_id = {hit['id']: hit for hit in vector_hits}
+        scores = rrf_scores([[hit['id'] for hit in vector_hits], [chunk_id for chunk_id, _ in keyword_hits]], rrf_k)
         
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-        )
+        top_ids = sorted(scores, key=scores.get, reverse=True)[:n_results]
         
-        search_results = []
-        for i in range(len(results['documents'][0])):
-            search_results.append({
-                'document': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i]
-            })
+        # 키워드 검색에서만 나온 청크는 본문/메타데이터를 따로 조회 (거리 정보 없음)
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in hits_by_id]
+        if missing:
+            for hit in self._get_chunks(missing, tenants):
+                hit['distance'] = None
+                hits_by_id[hit['id']] = hit
         
-        return search_results
+        results = []
+        for chunk_id in top_ids:
+            if chunk_id in hits_by_id:
+                hit = dict(hits_by_id[chunk_id])
+                hit['score'] = scores[chunk_id]
+                results.append(hit)
+        return results
     
-    def list_documents(self) -> List[str]:
+    def retrieve(self, query: str, n_results: int = 5, candidates: int = 20, query_embedding: List[float] = None,
+                 mmr_lambda: float = 0.7, max_distance: Optional[float] = None, tenants: List[str] = None) -> List[dict]:
+        """후보를 넉넉히 가져와 거리 컷오프 → MMR 다양화 → 인접 청크 병합 순으로 정리.
+        max_distance를 주지 않으면 현재 임베딩 모델의 기본 컷오프(self.max_distance, 없으면 컷오프 안 함)"""
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        vector_hits = self._query(query_embedding, candidates, tenants, include_embeddings=True)
+        keyword_hits = self.keyword_index.search(query, candidates, tenants)
+        return self._select(query_embedding, vector_hits, keyword_hits, n_results, mmr_lambda, max_distance, tenants)
+    
+    async def aretrieve(self, query: str, n_results: int = 5, candidates: int = 20, query_embedding: List[float] = None,
+                        mmr_lambda: float = 0.7, max_distance: Optional[float] = None, tenants: List[str] = None) -> List[dict]:
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query)
+        vector_hits = await asyncio.to_thread(self._query, query_embedding, candidates, tenants, True)
+        keyword_hits = await asyncio.to_thread(self.keyword_index.search, query, candidates, tenants)
+        return await asyncio.to_thread(self._select, query_embedding, vector_hits, keyword_hits,
+                                       n_results, mmr_lambda, max_distance, tenants)
+    
+    def _select(self, query_embedding: List[float], vector_hits: List[dict], keyword_hits: List[tuple],
+                n_results: int, mmr_lambda: float, max_distance: Optional[float] = None,
+                tenants: List[str] = None) -> List[dict]:
+        with metrics.span("mmr_select"):
+            keyword_ids = [chunk_id for chunk_id, _ in keyword_hits]
+            scores = rrf_scores([[hit['id'] for hit in vector_hits], keyword_ids])
+            if not scores:
+                return []
+            
+            # 후보 임베딩은 Chroma에 저장된 값을 재사용 (임베딩 API 호출 없음)
+            hits_by_id = {hit['id']: hit for hit in vector_hits}
+            missing = [chunk_id for chunk_id in keyword_ids if chunk_id not in hits_by_id]
+            if missing:
+                for hit in self._get_chunks(missing, tenants, include_embeddings=True):
+                    hits_by_id[hit['id']] = hit
+            candidates = [hits_by_id[chunk_id] for chunk_id in sorted(scores, key=scores.get, reverse=True)
+                          if chunk_id in hits_by_id]
+            if not candidates:
+                return []
+            embeddings = [hit['embedding'] for hit in candidates]
+            similarities = cosine_similarities(query_embedding, embeddings)
+            
+            # 거리 컷오프 (키워드로 정확히 걸린 청크는 유지)
+            if max_distance is None:
+                max_distance = self.max_distance
+            keyword_set = set(keyword_ids)
+            keep = [i for i, hit in enumerate(candidates)
+                    if max_distance is None or 1 - similarities[i] <= max_distance or hit['id'] in keyword_set]
+            if not keep:
+                return []
+            
+            # MMR 관련도에는 질의 유사도와 RRF 순위를 함께 반영
+            fused = np.array([scores[candidates[i]['id']] for i in keep], dtype=np.float32)
+            relevance = similarities[keep] + fused / fused.max() * 0.1
+            order = mmr_select(relevance, [embeddings[i] for i in keep], n_results, mmr_lambda)
+            
+            hits = []
+            for position in order:
+                hit = candidates[keep[position]]
+                hits.append({
+                    'id': hit['id'],
+                    'document': hit['document'],
+                    'metadata': hit['metadata'],
+                    'distance': float(1 - similarities[keep[position]]),
+                    'score': scores[hit['id']],
+                    'tenant': hit['tenant'],
+                })
+            return merge_adjacent(hits)
+    
+    def _fan_out(self, fn, tenants: List[str]) -> List:
+        """샤드별 fn(tenant)을 동시에 실행해 결과 목록을 모음 (샤드가 하나면 바로 실행)"""
+        if len(tenants) == 1:
+            return [fn(tenants[0])]
+        futures = [self._search_executor.submit(fn, tenant) for tenant in tenants]
+        return [future.result() for future in futures]
+    
+    def _query(self, query_embedding: List[float], n_results: int, tenants: List[str] = None,
+               include_embeddings: bool = False) -> List[dict]:
+        """라우팅된 샤드를 병렬 검색한 뒤 거리순으로 병합"""
+        shards = self._route(tenants)
+        if not shards:
+            return []
+        
+        def query_shard(tenant):
+            collection = self.get_collection(tenant)
+            if collection.count() == 0:
+                return []
+            include = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=min(n_results, collection.count()),
+                include=include
+            )
+            hits = []
+            for i in range(len(results['documents'][0])):
+                hit = {
+                    'id': results['ids'][0][i],
+                    'document': results['documents'][0][i],
+                    'metadata': results['metadatas'][0][i],
+                    'distance': results['distances'][0][i],
+                    'tenant': tenant
+                }
+                if include_embeddings:
+                    hit['embedding'] = results['embeddings'][0][i]
+                hits.append(hit)
+            return hits
+        
+        with metrics.span("chroma_query"):
+            search_results = [hit for hits in self._fan_out(query_shard, shards) for hit in hits]
+        search_results.sort(key=lambda hit: hit['distance'])
+        return search_results[:n_results]
+    
+    def _get_chunks(self, ids: List[str], tenants: List[str] = None, include_embeddings: bool = False) -> List[dict]:
+        """id로 청크 조회 (어느 샤드에 있는지 모르므로 라우팅된 샤드 전체에 요청)"""
+        shards = self._route(tenants)
+        if not shards:
+            return []
+        
+        def get_shard(tenant):
+            include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+            fetched = self.get_collection(tenant).get(ids=ids, include=include)
+            hits = []
+            for i, chunk_id in enumerate(fetched['ids']):
+                hit = {'id': chunk_id, 'document': fetched['documents'][i],
+                       'metadata': fetched['metadatas'][i], 'tenant': tenant}
+                if include_embeddings:
+                    hit['embedding'] = fetched['embeddings'][i]
+                hits.append(hit)
+            return hits
+        
+        return [hit for hits in self._fan_out(get_shard, shards) for hit in hits]
+    
+    def list_documents(self, tenants: List[str] = None) -> List[str]:
         try:
-            all_docs = self.collection.get()
-            sources = set()
-            for metadata in all_docs['metadatas']:
-                if 'source' in metadata:
-                    sources.add(metadata['source'])
-            return list(sources)
+            return self.registry.list_sources(tenants)
         except Exception as e:
             return []
     
+    def get_document_stats(self, tenants: List[str] = None) -> List[Dict]:
+        return self.registry.list_documents(tenants)
+    
     def delete_document(self, document_name: str):
-        all_docs = self.collection.get()
-        ids_to_delete = []
-        
-        for i, metadata in enumerate(all_docs['metadatas']):
-            if metadata.get('source') == document_name:
-                ids_to_delete.append(all_docs['ids'][i])
-        
-        if ids_to_delete:
-            self.collection.delete(ids=ids_to_delete)
\ No newline at end of file
+        tenant = self._tenant_for(document_name)
+        self.get_collection(tenant).delete(where={"source": document_name})
+        self.registry.remove(document_name)
+        self.keyword_index.remove_source(document_name)
+        self._notify_change(document_name, 'deleted')
+
+def create_embedding_pipeline(provider: EmbeddingProvider) -> EmbeddingPipeline:
+    """원격 API는 EMBEDDING_RPM/EMBEDDING_TPM 제한과 동시 요청으로, 로컬 모델은 제한 없이 큰 배치로 처리"""
+    rate_limiter = None
+    if provider.remote:
+        rate_limiter = RateLimiter(
+            requests_per_minute=int(os.getenv('EMBEDDING_RPM', 3000)),
+            tokens_per_minute=int(os.getenv('EMBEDDING_TPM', 1000000))
+        )
+    return EmbeddingPipeline(
+        provider.embed,
+        model=provider.name,
+        rate_limiter=rate_limiter,
+        max_workers=provider.max_workers
+    )